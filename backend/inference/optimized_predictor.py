@@ -10,9 +10,13 @@ import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
 import time
+import asyncio
 from loguru import logger
-from functools import lru_cache
+from collections import OrderedDict
+import hashlib
+import io
 import os
+import threading
 
 
 class OptimizedPredictor:
@@ -22,6 +26,23 @@ class OptimizedPredictor:
     _model = None
     _processor = None
     _device = None
+    # Preprocessed images keyed by a hash of the file contents (LRU)
+    _image_cache = OrderedDict()
+    _image_cache_size = 100
+    # Vision encoder outputs for the same keys (LRU, kept on the device)
+    _feature_cache = OrderedDict()
+    _feature_cache_size = 32
+    # Finished predictions keyed by (image key, method, beam width, max length)
+    # -> (monotonic timestamp, result) (LRU, expire after _result_cache_ttl s)
+    _result_cache = OrderedDict()
+    _result_cache_size = 256
+    _result_cache_ttl = 3600
+    # CUDA graph of the vision encoder: (graph, static input, static output),
+    # False once capture has failed
+    _vision_graph = None
+    # Guards the caches above: warmup() fills them from a worker thread while
+    # predict() runs on the caller's (reentrant: warmup holds it throughout)
+    _lock = threading.RLock()
     
     def __new__(cls):
         """Singleton pattern to ensure model is loaded only once."""
@@ -76,15 +97,157 @@ class OptimizedPredictor:
                 logger.error(f"Failed to load model: {e}")
                 raise
     
-    @lru_cache(maxsize=100)
     def _preprocess_image_cached(self, image_path: str):
         """Cache preprocessed images to avoid redundant processing."""
-        image = Image.open(image_path).convert('RGB')
+        return self._load_image(image_path)[1]
+    
+    def _load_image(self, image_path: str):
+        """
+        Load and preprocess an image, returning (content key, image).
+        
+        Keyed by a BLAKE2b digest of the file bytes rather than the path, so
+        a file rewritten in place (e.g. a reused upload path) isn't served
+        stale, and the same image under two paths is decoded once.
+        """
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        key = hashlib.blake2b(data, digest_size=16).digest()
+        
+        with self._lock:
+            image = self._image_cache.get(key)
+            if image is not None:
+                self._image_cache.move_to_end(key)
+                return key, image
+        
+        image = Image.open(io.BytesIO(data))
         # Resize to optimal size for faster processing
         max_size = 384  # BLIP base model optimal size
+        # JPEGs can be decoded directly at a reduced scale (DCT scaling)
+        image.draft('RGB', (max_size, max_size))
+        image = image.convert('RGB')
         if max(image.size) > max_size:
             image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        return image
+        
+        with self._lock:
+            self._image_cache[key] = image
+            if len(self._image_cache) > self._image_cache_size:
+                self._image_cache.popitem(last=False)
+        return key, image
+    
+    def _image_features(self, key: bytes, image) -> torch.Tensor:
+        """
+        Vision encoder output for an image, cached by content key.
+        
+        Repeated captions of the same image (other method, beam width or
+        length) skip the ViT forward pass and only run the text decoder.
+        """
+        with self._lock:
+            image_embeds = self._feature_cache.get(key)
+            if image_embeds is not None:
+                self._feature_cache.move_to_end(key)
+                return image_embeds
+        
+        pixel_values = self._processor(image, return_tensors="pt").pixel_values
+        pixel_values = pixel_values.to(self._device, self._model.dtype)
+        image_embeds = self._encode_image(pixel_values)
+        
+        with self._lock:
+            self._feature_cache[key] = image_embeds
+            if len(self._feature_cache) > self._feature_cache_size:
+                self._feature_cache.popitem(last=False)
+        return image_embeds
+    
+    def _encode_image(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        """
+        Run the vision encoder, replaying a captured CUDA graph when possible.
+        
+        The encoder always sees a (1, 3, 384, 384) input, so on CUDA its
+        kernels are recorded once and replayed, saving the per-kernel launch
+        overhead. CPU (or any other input shape) runs eagerly.
+        """
+        if self._device == 'cuda':
+            # One capture, and copy -> replay -> clone must not interleave
+            # with another thread's (static buffers are shared)
+            with self._lock:
+                if self._vision_graph is None:
+                    self._capture_vision_graph(pixel_values)
+                
+                if self._vision_graph and self._vision_graph[1].shape == pixel_values.shape:
+                    graph, static_input, static_output = self._vision_graph
+                    static_input.copy_(pixel_values)
+                    graph.replay()
+                    # The output buffer is overwritten by the next replay
+                    return static_output.clone()
+        
+        with torch.no_grad():
+            return self._model.vision_model(pixel_values=pixel_values)[0]
+    
+    def _capture_vision_graph(self, pixel_values: torch.Tensor):
+        """Record the vision encoder forward pass into a CUDA graph."""
+        try:
+            static_input = pixel_values.clone()
+            
+            # Warm up on a side stream before capture, as CUDA graphs require
+            stream = torch.cuda.Stream()
+            stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(stream), torch.no_grad():
+                for _ in range(3):
+                    self._model.vision_model(pixel_values=static_input)
+            torch.cuda.current_stream().wait_stream(stream)
+            
+            graph = torch.cuda.CUDAGraph()
+            with torch.no_grad(), torch.cuda.graph(graph):
+                static_output = self._model.vision_model(pixel_values=static_input)[0]
+            
+            self._vision_graph = (graph, static_input, static_output)
+            logger.info("✓ Vision encoder captured as a CUDA graph")
+        except Exception as e:
+            logger.warning(f"CUDA graph capture failed, running eagerly: {e}")
+            self._vision_graph = False
+    
+    def _generate(self, image_embeds: torch.Tensor, method: str, max_length: int, beam_width: int):
+        """
+        Run the BLIP text decoder on precomputed image features.
+        
+        Mirrors BlipForConditionalGeneration.generate minus the vision
+        forward pass: the prompt is just BOS, with EOS = [SEP].
+        """
+        text_config = self._model.config.text_config
+        batch_size = image_embeds.shape[0]
+        input_ids = torch.full((batch_size, 1), text_config.bos_token_id,
+                               dtype=torch.long, device=image_embeds.device)
+        image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long,
+                                          device=image_embeds.device)
+        
+        if method == "beam_search":
+            generate_kwargs = dict(num_beams=beam_width, early_stopping=True, num_return_sequences=1)
+        else:  # greedy
+            generate_kwargs = dict(num_beams=1, do_sample=False)
+        
+        with torch.no_grad():
+            return self._model.text_decoder.generate(
+                input_ids=input_ids,
+                eos_token_id=text_config.sep_token_id,
+                pad_token_id=text_config.pad_token_id,
+                encoder_hidden_states=image_embeds,
+                encoder_attention_mask=image_attention_mask,
+                max_length=max_length,
+                use_cache=True,  # Enable KV cache for faster generation
+                **generate_kwargs
+            )
+    
+    async def warmup(self, image_paths: list):
+        """
+        Precompute image features for image_paths in a worker thread (e.g.
+        while the server is idle) so later predictions skip the encoder.
+        """
+        def fill():
+            with self._lock:
+                self._load_model()
+                for path in image_paths:
+                    self._image_features(*self._load_image(path))
+        
+        await asyncio.to_thread(fill)
     
     def predict(
         self, 
@@ -112,31 +275,28 @@ class OptimizedPredictor:
         start_time = time.time()
         
         try:
-            # Load and preprocess image with caching
-            image = self._preprocess_image_cached(image_path)
+            # Load and preprocess image, then encode it (both cached by content)
+            key, image = self._load_image(image_path)
             
-            # Process image
-            inputs = self._processor(image, return_tensors="pt").to(self._device)
+            # Same image and settings -> same caption; beam width is unused by greedy
+            result_key = (key, method, beam_width if method == "beam_search" else 1, max_length)
+            with self._lock:
+                cached = self._result_cache.get(result_key)
+                if cached is not None and time.monotonic() - cached[0] < self._result_cache_ttl:
+                    self._result_cache.move_to_end(result_key)
+                else:
+                    cached = None
+            if cached is not None:
+                return dict(
+                    cached[1],
+                    inference_time_ms=round((time.time() - start_time) * 1000, 2),
+                    from_cache=True
+                )
+            
+            image_embeds = self._image_features(key, image)
             
-            # Generate caption with no gradient computation
-            with torch.no_grad():
-                if method == "beam_search":
-                    outputs = self._model.generate(
-                        **inputs,
-                        max_length=max_length,
-                        num_beams=beam_width,
-                        early_stopping=True,
-                        num_return_sequences=1,
-                        use_cache=True  # Enable KV cache for faster generation
-                    )
-                else:  # greedy
-                    outputs = self._model.generate(
-                        **inputs,
-                        max_length=max_length,
-                        num_beams=1,
-                        do_sample=False,
-                        use_cache=True
-                    )
+            # Generate caption from the cached image features
+            outputs = self._generate(image_embeds, method, max_length, beam_width)
             
             # Decode caption
             caption = self._processor.decode(outputs[0], skip_special_tokens=True)
@@ -144,13 +304,22 @@ class OptimizedPredictor:
             # Calculate inference time
             inference_time_ms = (time.time() - start_time) * 1000
             
-            return {
+            result = {
                 "caption": caption,
                 "inference_time_ms": round(inference_time_ms, 2),
                 "model_version": f"{self.model_name}-optimized",
                 "method": method
             }
             
+            # Callers get their own copy, so mutating it can't alter the cache
+            with self._lock:
+                self._result_cache[result_key] = (time.monotonic(), result)
+                self._result_cache.move_to_end(result_key)
+                if len(self._result_cache) > self._result_cache_size:
+                    self._result_cache.popitem(last=False)
+            
+            return dict(result)
+            
         except Exception as e:
             logger.error(f"Error generating caption: {e}")
             raise
@@ -240,8 +409,11 @@ class OptimizedPredictor:
         return results
     
     def clear_cache(self):
-        """Clear the image preprocessing cache."""
-        self._preprocess_image_cached.cache_clear()
+        """Clear the image preprocessing, feature and result caches."""
+        with self._lock:
+            self._image_cache.clear()
+            self._feature_cache.clear()
+            self._result_cache.clear()
         logger.info("Image cache cleared")
 
 
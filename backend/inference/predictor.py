@@ -43,11 +43,14 @@ class CaptionPredictor:
         config = checkpoint.get('model_config', {})
         vocab_size = config.get('vocab_size', len(self.vocabulary))
         embed_dim = config.get('embed_dim', 512)
+        # Checkpoints saved before weight tying have separate fc_out weights
+        tie_weights = config.get('tie_weights', False)
         
         # Initialize model
         self.model = CaptioningModel(
             vocab_size=vocab_size,
-            embed_dim=embed_dim
+            embed_dim=embed_dim,
+            tie_weights=tie_weights
         )
         self.model.load_state_dict(checkpoint['model_state_dict'])
         self.model = self.model.to(self.device)
@@ -108,6 +111,38 @@ class CaptionPredictor:
         # Preprocess
         image_tensor = self.preprocess_image(image).to(self.device)
         
+        return self.predict_from_tensor(
+            image_tensor,
+            method=method,
+            beam_width=beam_width,
+            max_length=max_length,
+            temperature=temperature,
+            return_probs=return_probs
+        )
+    
+    def predict_from_tensor(
+        self,
+        image_tensor: torch.Tensor,
+        method: str = 'beam_search',
+        beam_width: int = 5,
+        max_length: int = 50,
+        temperature: float = 1.0,
+        return_probs: bool = False
+    ) -> Union[str, Dict]:
+        """
+        Generate caption for an already preprocessed image.
+        
+        Args:
+            image_tensor: Output of preprocess_image, (1, 3, H, W), on self.device
+            method: 'greedy' or 'beam_search'
+            beam_width: Beam width for beam search
+            max_length: Maximum caption length
+            temperature: Sampling temperature
+            return_probs: Return token probabilities
+            
+        Returns:
+            caption: Generated caption string (or dict with probs if return_probs=True)
+        """
         # Generate
         with torch.no_grad():
             caption_indices = self.model.generate_caption(
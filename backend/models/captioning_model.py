@@ -5,7 +5,8 @@ Combines encoder and decoder with training/inference methods.
 
 import torch
 import torch.nn as nn
-from .encoder import ImageEncoder
+from torch.nn.utils.rnn import pad_sequence
+from .encoder import ImageEncoder, ImageNormalize
 from .decoder import TransformerDecoder
 
 
@@ -25,7 +26,8 @@ class CaptioningModel(nn.Module):
         max_seq_len: int = 52,
         pretrained_encoder: bool = True,
         fine_tune_encoder: bool = True,
-        fine_tune_layers: int = 2
+        fine_tune_layers: int = 2,
+        tie_weights: bool = True
     ):
         """
         Args:
@@ -39,6 +41,7 @@ class CaptioningModel(nn.Module):
             pretrained_encoder: Use pretrained encoder
             fine_tune_encoder: Fine-tune encoder
             fine_tune_layers: Number of encoder layers to fine-tune
+            tie_weights: Tie decoder input embedding and output projection
         """
         super(CaptioningModel, self).__init__()
         
@@ -58,11 +61,24 @@ class CaptioningModel(nn.Module):
             num_layers=num_layers,
             ff_dim=ff_dim,
             dropout=dropout,
-            max_seq_len=max_seq_len
+            max_seq_len=max_seq_len,
+            tie_weights=tie_weights
         )
         
+        # Normalization for uint8 batches, applied on the model's device
+        self.gpu_preproc = nn.Sequential(ImageNormalize())
+        
         self.vocab_size = vocab_size
         self.embed_dim = embed_dim
+        
+        # Cached by get_trainable_parameters()
+        self._param_groups = None
+    
+    def _prepare_images(self, images: torch.Tensor) -> torch.Tensor:
+        """Normalize uint8 images on device; float inputs are assumed normalized."""
+        if images.dtype == torch.uint8:
+            images = self.gpu_preproc(images)
+        return images
     
     def forward(
         self,
@@ -74,13 +90,15 @@ class CaptioningModel(nn.Module):
         Forward pass for training.
         
         Args:
-            images: (batch_size, 3, H, W)
+            images: (batch_size, 3, H, W), uint8 or already-normalized float
             captions: (batch_size, seq_len)
             caption_mask: Optional causal mask
             
         Returns:
             output: (batch_size, seq_len, vocab_size)
         """
+        images = self._prepare_images(images)
+        
         # Encode images
         image_features = self.encoder.get_feature_maps_flattened(images)
         
@@ -120,14 +138,16 @@ class CaptioningModel(nn.Module):
             # Add batch dimension if needed
             if image.dim() == 3:
                 image = image.unsqueeze(0)
+            image = self._prepare_images(image)
             
             # Encode image
             image_features = self.encoder.get_feature_maps_flattened(image)
             
             # Generate caption
             if method == 'greedy':
+                # A single caption is done at its first end_token; check every step
                 captions = self.decoder.greedy_decode(
-                    image_features, start_token, end_token, max_len
+                    image_features, start_token, end_token, max_len, sync_interval=1
                 )
                 return captions[0]  # Return first (and only) caption
             
@@ -140,19 +160,65 @@ class CaptioningModel(nn.Module):
             else:
                 raise ValueError(f"Unknown decoding method: {method}")
     
-    def get_trainable_parameters(self):
-        """Get trainable parameters with separate encoder/decoder groups."""
-        encoder_params = []
-        decoder_params = []
+    def generate_captions_batch(
+        self,
+        images: torch.Tensor,
+        start_token: int,
+        end_token: int,
+        max_len: int = 50,
+        method: str = 'greedy',
+        beam_width: int = 5,
+        temperature: float = 1.0
+    ) -> torch.Tensor:
+        """
+        Generate captions for a batch of images with a single encoder pass.
         
-        for name, param in self.named_parameters():
-            if param.requires_grad:
-                if 'encoder' in name:
-                    encoder_params.append(param)
-                else:
-                    decoder_params.append(param)
+        Args:
+            images: (batch_size, 3, H, W)
+            start_token: Start token index
+            end_token: End token index
+            max_len: Maximum caption length
+            method: 'greedy' (decoded as one batch) or 'beam_search' (per image)
+            beam_width: Beam width for beam search
+            temperature: Temperature for beam search
+            
+        Returns:
+            captions: (batch_size, seq_len) token indices, padded with end_token
+        """
+        self.eval()
+        
+        with torch.no_grad():
+            images = self._prepare_images(images)
+            image_features = self.encoder.get_feature_maps_flattened(images)
+            
+            if method == 'greedy':
+                return self.decoder.greedy_decode(
+                    image_features, start_token, end_token, max_len
+                )
+            
+            elif method == 'beam_search':
+                captions = [
+                    self.decoder.beam_search_decode(
+                        image_features[i:i+1], start_token, end_token,
+                        max_len, beam_width, temperature
+                    )
+                    for i in range(image_features.size(0))
+                ]
+                return pad_sequence(captions, batch_first=True, padding_value=end_token)
+            
+            else:
+                raise ValueError(f"Unknown decoding method: {method}")
+    
+    def get_trainable_parameters(self):
+        """
+        Get trainable parameters with separate encoder/decoder groups.
         
-        return {
-            'encoder': encoder_params,
-            'decoder': decoder_params
-        }
+        The groups are cached. Layers are only frozen when the encoder is
+        constructed, so requires_grad doesn't change afterwards.
+        """
+        if self._param_groups is None:
+            self._param_groups = {
+                'encoder': [p for p in self.encoder.parameters() if p.requires_grad],
+                'decoder': [p for p in self.decoder.parameters() if p.requires_grad]
+            }
+        return self._param_groups
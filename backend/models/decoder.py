@@ -50,7 +50,8 @@ class TransformerDecoder(nn.Module):
         num_layers: int = 6,
         ff_dim: int = 2048,
         dropout: float = 0.1,
-        max_seq_len: int = 52
+        max_seq_len: int = 52,
+        tie_weights: bool = True
     ):
         """
         Args:
@@ -61,11 +62,13 @@ class TransformerDecoder(nn.Module):
             ff_dim: Feedforward dimension
             dropout: Dropout probability
             max_seq_len: Maximum sequence length
+            tie_weights: Share the token embedding with the output projection
         """
         super(TransformerDecoder, self).__init__()
         
         self.embed_dim = embed_dim
         self.vocab_size = vocab_size
+        self.tie_weights = tie_weights
         
         # Token embedding
         self.token_embedding = nn.Embedding(vocab_size, embed_dim)
@@ -86,35 +89,39 @@ class TransformerDecoder(nn.Module):
             num_layers=num_layers
         )
         
-        # Output projection
+        # Output projection (weight shared with the embedding when tied)
         self.fc_out = nn.Linear(embed_dim, vocab_size)
-        
-        # Dropout
-        self.dropout = nn.Dropout(dropout)
+        if tie_weights:
+            self.fc_out.weight = self.token_embedding.weight
         
         # Initialize weights
         self._init_weights()
     
     def _init_weights(self):
-        """Initialize weights using Xavier initialization."""
-        nn.init.xavier_uniform_(self.token_embedding.weight)
-        nn.init.xavier_uniform_(self.fc_out.weight)
+        """Initialize embedding with N(0, d^-0.5) and the untied projection with Xavier."""
+        nn.init.normal_(self.token_embedding.weight, std=self.embed_dim ** -0.5)
+        if not self.tie_weights:
+            nn.init.xavier_uniform_(self.fc_out.weight)
         nn.init.constant_(self.fc_out.bias, 0)
     
     def forward(
         self,
         image_features: torch.Tensor,
         captions: torch.Tensor,
-        caption_mask: torch.Tensor = None
+        caption_mask: torch.Tensor = None,
+        project_last_only: bool = False
     ) -> torch.Tensor:
         """
         Args:
             image_features: (batch_size, num_pixels, embed_dim)
             captions: (batch_size, seq_len) - token indices
             caption_mask: (seq_len, seq_len) - causal mask
+            project_last_only: Only project the final timestep to the
+                vocabulary (all decoding needs)
             
         Returns:
-            outputs: (batch_size, seq_len, vocab_size)
+            outputs: (batch_size, seq_len, vocab_size), or
+                (batch_size, 1, vocab_size) if project_last_only
         """
         batch_size, seq_len = captions.shape
         
@@ -135,7 +142,9 @@ class TransformerDecoder(nn.Module):
         )  # (B, seq_len, embed_dim)
         
         # Project to vocabulary
-        output = self.fc_out(output)  # (B, seq_len, vocab_size)
+        if project_last_only:
+            output = output[:, -1:, :]  # (B, 1, embed_dim)
+        output = self.fc_out(output)  # (B, seq_len or 1, vocab_size)
         
         return output
     
@@ -157,7 +166,8 @@ class TransformerDecoder(nn.Module):
         image_features: torch.Tensor,
         start_token: int,
         end_token: int,
-        max_len: int = 50
+        max_len: int = 50,
+        sync_interval: int = 8
     ) -> torch.Tensor:
         """
         Greedy decoding for inference.
@@ -167,31 +177,41 @@ class TransformerDecoder(nn.Module):
             start_token: Start token index
             end_token: End token index
             max_len: Maximum generation length
+            sync_interval: Steps between host-side "all finished" checks
             
         Returns:
-            captions: (batch_size, seq_len)
+            captions: (batch_size, seq_len); finished rows are padded with end_token
         """
         batch_size = image_features.size(0)
         device = image_features.device
         
-        # Initialize with start token
-        captions = torch.full((batch_size, 1), start_token, dtype=torch.long, device=device)
+        # Preallocated output buffer, written in place each step
+        captions = torch.full(
+            (batch_size, max_len + 1), end_token, dtype=torch.long, device=device
+        )
+        captions[:, 0] = start_token
+        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
         
-        for _ in range(max_len):
-            # Forward pass
-            output = self.forward(image_features, captions)  # (B, seq_len, vocab_size)
+        steps = 0
+        for t in range(max_len):
+            steps = t + 1
             
-            # Get next token (greedy)
-            next_token = output[:, -1, :].argmax(dim=-1, keepdim=True)  # (B, 1)
+            # Forward pass
+            output = self.forward(
+                image_features, captions[:, :t + 1], project_last_only=True
+            )  # (B, 1, vocab_size)
             
-            # Append to captions
-            captions = torch.cat([captions, next_token], dim=1)
+            # Get next token (greedy); finished rows keep emitting end_token
+            next_token = output[:, -1, :].argmax(dim=-1)  # (B,)
+            next_token = next_token.masked_fill(finished, end_token)
+            captions[:, t + 1] = next_token
+            finished |= next_token == end_token
             
-            # Check if all sequences have ended
-            if (next_token == end_token).all():
+            # Check if all sequences have ended (only every few steps to avoid syncs)
+            if steps % sync_interval == 0 and finished.all():
                 break
         
-        return captions
+        return captions[:, :steps + 1]
     
     def beam_search_decode(
         self,
@@ -200,7 +220,8 @@ class TransformerDecoder(nn.Module):
         end_token: int,
         max_len: int = 50,
         beam_width: int = 5,
-        temperature: float = 1.0
+        temperature: float = 1.0,
+        sync_interval: int = 8
     ) -> torch.Tensor:
         """
         Beam search decoding for better quality captions.
@@ -212,55 +233,77 @@ class TransformerDecoder(nn.Module):
             max_len: Maximum generation length
             beam_width: Beam width
             temperature: Sampling temperature
+            sync_interval: Steps between host-side early-stopping checks
             
         Returns:
             best_caption: (seq_len,)
         """
         device = image_features.device
+        neg_inf = float('-inf')
+        
+        # All beams advance together: sequences live in a preallocated
+        # (beam_width, max_len + 1) buffer and scores in a (beam_width,) tensor.
+        # Only beam 0 is live at the start so the first step expands a single
+        # hypothesis, exactly like the unbatched search.
+        sequences = torch.full(
+            (beam_width, max_len + 1), end_token, dtype=torch.long, device=device
+        )
+        sequences[:, 0] = start_token
+        scores = torch.full((beam_width,), neg_inf, device=device)
+        scores[0] = 0.0
+        memory = image_features.expand(beam_width, -1, -1)
         
-        # Initialize beams
-        # Each beam: (sequence, score)
-        beams = [(torch.tensor([start_token], device=device), 0.0)]
-        completed_beams = []
+        # Best completed hypothesis so far (score, padded sequence, length)
+        finished_score = torch.tensor(neg_inf, device=device)
+        finished_seq = sequences[0].clone()
+        finished_len = torch.tensor(1, dtype=torch.long, device=device)
+        # Length of a hypothesis ending at each step, so the loop doesn't
+        # allocate a new tensor per step
+        step_lens = torch.arange(2, max_len + 2, device=device)
         
+        steps = 0
         for step in range(max_len):
-            candidates = []
+            steps = step + 1
+            
+            # Forward pass for every beam at once
+            output = self.forward(
+                memory, sequences[:, :step + 1], project_last_only=True
+            )  # (W, 1, vocab_size)
+            
+            # Log-probabilities for next token
+            logits = output[:, -1, :] / temperature  # (W, vocab_size)
+            log_probs = torch.log_softmax(logits, dim=-1)
             
-            for seq, score in beams:
-                # Skip if sequence already ended
-                if seq[-1].item() == end_token:
-                    completed_beams.append((seq, score))
-                    continue
-                
-                # Forward pass
-                seq_input = seq.unsqueeze(0)  # (1, seq_len)
-                output = self.forward(image_features, seq_input)  # (1, seq_len, vocab_size)
-                
-                # Get probabilities for next token
-                logits = output[0, -1, :] / temperature  # (vocab_size,)
-                log_probs = torch.log_softmax(logits, dim=-1)
-                
-                # Get top-k candidates
-                top_log_probs, top_indices = torch.topk(log_probs, beam_width)
-                
-                for log_prob, token_idx in zip(top_log_probs, top_indices):
-                    new_seq = torch.cat([seq, token_idx.unsqueeze(0)])
-                    new_score = score + log_prob.item()
-                    candidates.append((new_seq, new_score))
+            # Top-k per beam, then top-k over all W*W candidates
+            top_log_probs, top_indices = torch.topk(log_probs, beam_width, dim=-1)  # (W, W)
+            cand_scores = (scores.unsqueeze(1) + top_log_probs).view(-1)  # (W*W,)
+            cand_tokens = top_indices.view(-1)  # (W*W,)
             
-            # Select top beam_width candidates
-            beams = sorted(candidates, key=lambda x: x[1], reverse=True)[:beam_width]
+            scores, top_idx = torch.topk(cand_scores, beam_width)
+            parent = top_idx // beam_width
+            tokens = cand_tokens[top_idx]
             
-            # Early stopping if all beams completed
-            if len(beams) == 0:
+            # Reorder histories and append the new tokens
+            sequences = sequences[parent]
+            sequences[:, step + 1] = tokens
+            
+            # Retire beams that just emitted <end>, keeping the best one
+            ended_scores = torch.where(tokens == end_token, scores, neg_inf)
+            best_ended, best_ended_idx = ended_scores.max(dim=0)
+            improved = best_ended > finished_score
+            finished_seq = torch.where(improved, sequences[best_ended_idx], finished_seq)
+            finished_len = torch.where(improved, step_lens[step], finished_len)
+            finished_score = torch.maximum(finished_score, best_ended)
+            scores = torch.where(tokens == end_token, neg_inf, scores)
+            
+            # Scores only decrease, so stop once no live beam can win. Checked
+            # every few steps to avoid syncs; running past that point can't
+            # change the result, as live beams can only fall further behind
+            if steps % sync_interval == 0 and not bool(scores.max() > finished_score):
                 break
         
-        # Add remaining beams to completed
-        completed_beams.extend(beams)
-        
-        # Select best beam
-        if completed_beams:
-            best_seq, _ = max(completed_beams, key=lambda x: x[1])
-            return best_seq
-        else:
-            return beams[0][0]
+        # Remaining live beams compete with the best completed one
+        best_live, best_live_idx = scores.max(dim=0)
+        if bool(best_live > finished_score):
+            return sequences[best_live_idx, :steps + 1]
+        return finished_seq[:int(finished_len)]
@@ -8,6 +8,36 @@ import torch.nn as nn
 import torchvision.models as models
 
 
+class ImageNormalize(nn.Module):
+    """
+    On-device ImageNet normalization for uint8 image batches.
+    
+    Lets the data pipeline ship compact uint8 tensors to the GPU; the
+    scale/shift then runs there as a single elementwise pass.
+    """
+    
+    def __init__(
+        self,
+        mean: tuple = (0.485, 0.456, 0.406),
+        std: tuple = (0.229, 0.224, 0.225)
+    ):
+        super(ImageNormalize, self).__init__()
+        # Non-persistent so checkpoints are unaffected
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1), persistent=False)
+        self.register_buffer('std', torch.tensor(std).view(1, 3, 1, 1), persistent=False)
+    
+    def forward(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            images: (batch_size, 3, H, W) uint8 in [0, 255]
+            
+        Returns:
+            images: (batch_size, 3, H, W) float, normalized
+        """
+        images = images.float().div_(255)
+        return (images - self.mean) / self.std
+
+
 class ImageEncoder(nn.Module):
     """
     CNN encoder using ResNet50 pretrained on ImageNet.
@@ -47,6 +77,10 @@ class ImageEncoder(nn.Module):
             nn.Dropout(0.5)
         )
         
+        # NHWC (channels_last) lets cuDNN pick Tensor Core friendly conv kernels
+        self.resnet = self.resnet.to(memory_format=torch.channels_last)
+        self.projection = self.projection.to(memory_format=torch.channels_last)
+        
         # Freeze layers
         self._freeze_layers(fine_tune, fine_tune_layers)
         
@@ -84,6 +118,8 @@ class ImageEncoder(nn.Module):
         Returns:
             features: (batch_size, embed_dim, grid_h, grid_w)
         """
+        images = images.contiguous(memory_format=torch.channels_last)
+        
         # Extract spatial features
         features = self.resnet(images)  # (B, 2048, H/32, W/32)
         
@@ -105,7 +141,7 @@ class ImageEncoder(nn.Module):
         features = self.forward(images)  # (B, embed_dim, H, W)
         batch_size, embed_dim, h, w = features.shape
         
-        # Reshape to (B, num_pixels, embed_dim)
+        # Reshape to (B, num_pixels, embed_dim); a stride-only op for channels_last
         features = features.permute(0, 2, 3, 1)  # (B, H, W, embed_dim)
         features = features.view(batch_size, h * w, embed_dim)
         
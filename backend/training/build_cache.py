@@ -0,0 +1,55 @@
+"""
+Pre-build decoded image caches for training.
+
+Writes the same uint8 memmaps that get_data_loaders(image_cache_dir=...)
+would otherwise build lazily on the first run, so the one-time JPEG
+decode can happen ahead of training.
+"""
+
+import argparse
+import os
+
+from training.vocabulary import Vocabulary
+from training.dataset import CaptionDataset, image_cache_path
+
+
+def parse_args():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Build decoded image cache')
+    
+    parser.add_argument('--image_dir', type=str, required=True, help='Images directory')
+    parser.add_argument('--captions', type=str, required=True, help='Captions file')
+    parser.add_argument('--split', type=str, default='train', choices=['train', 'val'])
+    parser.add_argument('--dataset_type', type=str, default='coco', choices=['coco', 'flickr8k'])
+    parser.add_argument('--image_size', type=int, default=224)
+    parser.add_argument('--cache_dir', type=str, required=True, help='Output directory (train.py --image_cache_dir)')
+    
+    return parser.parse_args()
+
+
+def main():
+    """Build the cache for one split."""
+    args = parse_args()
+    
+    # Training images keep a margin for RandomCrop, as in get_data_loaders
+    size = args.image_size + 32 if args.split == 'train' else args.image_size
+    cache_path = image_cache_path(args.cache_dir, args.split, args.dataset_type, size)
+    
+    if os.path.exists(cache_path):
+        print(f"Cache already exists: {cache_path}")
+        return
+    
+    # Image order only depends on the captions file, so any vocabulary will do
+    dataset = CaptionDataset(
+        args.image_dir,
+        args.captions,
+        Vocabulary(),
+        dataset_type=args.dataset_type
+    )
+    
+    os.makedirs(args.cache_dir, exist_ok=True)
+    dataset.build_cache(cache_path, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,15 +5,18 @@ Supports MS COCO and Flickr8k datasets.
 
 import os
 import json
-from typing import List, Tuple, Dict, Optional
+import math
+from typing import Iterator, List, Tuple, Dict, Optional
+import numpy as np
 import pandas as pd
 from PIL import Image
+from loguru import logger
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from torch.nn.utils.rnn import pad_sequence
 
 from .vocabulary import Vocabulary
-from .transforms import get_transforms
+from .transforms import get_transforms, get_transforms_minimal
 
 
 class CaptionDataset(Dataset):
@@ -26,7 +29,8 @@ class CaptionDataset(Dataset):
         vocabulary: Vocabulary,
         transform=None,
         max_length: int = 50,
-        dataset_type: str = 'coco'  # 'coco' or 'flickr8k'
+        dataset_type: str = 'coco',  # 'coco' or 'flickr8k'
+        image_cache: Optional[str] = None
     ):
         """
         Args:
@@ -36,6 +40,9 @@ class CaptionDataset(Dataset):
             transform: Image transformations
             max_length: Maximum caption length
             dataset_type: Type of dataset ('coco' or 'flickr8k')
+            image_cache: Optional .npy cache of pre-resized images written by
+                build_cache(). When present, images are read from it as uint8
+                (3, H, W) tensors instead of being decoded with PIL.
         """
         self.image_dir = image_dir
         self.vocabulary = vocabulary
@@ -43,18 +50,22 @@ class CaptionDataset(Dataset):
         self.max_length = max_length
         self.dataset_type = dataset_type
         
-        # Load captions
-        self.data = self._load_captions(captions_file)
+        # Load captions into flat parallel arrays (see _load_captions)
+        self._load_captions(captions_file)
         
-    def _load_captions(self, captions_file: str) -> List[Dict]:
-        """
-        Load captions from file.
+        # Decoded image cache (opened lazily so each worker maps it itself)
+        self.image_cache_path = None
+        self._image_cache = None
+        if image_cache and os.path.exists(image_cache):
+            self._attach_cache(image_cache)
         
-        Returns:
-            data: List of {'image_id': str, 'caption': str, 'image_path': str}
+    def _read_captions(self, captions_file: str) -> Iterator[Tuple[str, str]]:
         """
-        data = []
+        Read raw captions from file.
         
+        Yields:
+            (image_path, caption) pairs
+        """
         if self.dataset_type == 'coco':
             # MS COCO format
             with open(captions_file, 'r') as f:
@@ -65,30 +76,15 @@ class CaptionDataset(Dataset):
             
             # Extract captions
             for ann in coco_data['annotations']:
-                image_id = ann['image_id']
-                caption = ann['caption']
-                image_path = os.path.join(self.image_dir, image_map[image_id])
-                
-                data.append({
-                    'image_id': str(image_id),
-                    'caption': caption,
-                    'image_path': image_path
-                })
+                image_path = os.path.join(self.image_dir, image_map[ann['image_id']])
+                yield image_path, ann['caption']
         
         elif self.dataset_type == 'flickr8k':
             # Flickr8k format (CSV or text file)
             if captions_file.endswith('.csv'):
                 df = pd.read_csv(captions_file)
-                for _, row in df.iterrows():
-                    image_name = row['image']
-                    caption = row['caption']
-                    image_path = os.path.join(self.image_dir, image_name)
-                    
-                    data.append({
-                        'image_id': image_name,
-                        'caption': caption,
-                        'image_path': image_path
-                    })
+                for image_name, caption in zip(df['image'], df['caption']):
+                    yield os.path.join(self.image_dir, image_name), caption
             else:
                 # Text file format: image_name.jpg#caption_num\tcaption
                 with open(captions_file, 'r') as f:
@@ -97,19 +93,123 @@ class CaptionDataset(Dataset):
                         if len(parts) == 2:
                             image_caption_id, caption = parts
                             image_name = image_caption_id.split('#')[0]
-                            image_path = os.path.join(self.image_dir, image_name)
-                            
-                            data.append({
-                                'image_id': image_name,
-                                'caption': caption,
-                                'image_path': image_path
-                            })
+                            yield os.path.join(self.image_dir, image_name), caption
+    
+    def _load_captions(self, captions_file: str):
+        """
+        Load and encode captions once into structure-of-arrays storage.
         
-        print(f"Loaded {len(data)} image-caption pairs")
-        return data
+        Sets:
+            _img_paths: Unique image paths (shared by all captions of an image)
+            _img_path_idx: (N,) int32 index into _img_paths per caption
+            _tokens: Flat int32 buffer of encoded, truncated captions
+            _offsets: (N + 1,) int64 offsets of each caption into _tokens
+            lengths: (N,) int32 caption lengths (including special tokens)
+        """
+        path_to_idx = {}
+        img_paths = []
+        img_path_idx = []
+        captions = []
+        
+        for image_path, caption in self._read_captions(captions_file):
+            path_idx = path_to_idx.get(image_path)
+            if path_idx is None:
+                path_idx = path_to_idx[image_path] = len(img_paths)
+                img_paths.append(image_path)
+            img_path_idx.append(path_idx)
+            captions.append(caption)
+        
+        tokens = []
+        offsets = [0]
+        for caption_indices in self.vocabulary.batch_encode(captions, add_special_tokens=True):
+            # Truncate if too long
+            if len(caption_indices) > self.max_length:
+                caption_indices = caption_indices[:self.max_length-1] + [self.vocabulary.end_idx]
+            
+            tokens.extend(caption_indices)
+            offsets.append(len(tokens))
+        
+        self._img_paths = img_paths
+        self._img_path_idx = np.asarray(img_path_idx, dtype=np.int32)
+        self._tokens = np.asarray(tokens, dtype=np.int32)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.diff(self._offsets).astype(np.int32)
+        
+        print(f"Loaded {len(self._img_path_idx)} image-caption pairs "
+              f"({len(self._img_paths)} unique images)")
+    
+    def build_cache(self, cache_path: str, size: int):
+        """
+        Decode and resize every unique image once into a uint8 memmap.
+        
+        Args:
+            cache_path: Output .npy path
+            size: Side length images are resized to
+        """
+        num_images = len(self._img_paths)
+        # The .npy header is final as soon as the memmap exists, so fill a
+        # temporary file and only move it into place once complete; an
+        # interrupted build must not leave a valid-looking all-zero cache
+        tmp_path = cache_path + '.tmp'
+        try:
+            cache = np.lib.format.open_memmap(
+                tmp_path, mode='w+', dtype=np.uint8, shape=(num_images, 3, size, size)
+            )
+            
+            for i, image_path in enumerate(self._img_paths):
+                try:
+                    image = Image.open(image_path).convert('RGB')
+                    image = image.resize((size, size), Image.BILINEAR)
+                    cache[i] = np.asarray(image).transpose(2, 0, 1)
+                except Exception as e:
+                    print(f"Error loading image {image_path}: {e}")
+                    cache[i] = 0
+            
+            cache.flush()
+            del cache
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        print(f"Cached {num_images} images at {size}x{size} to {cache_path}")
+        
+        self._attach_cache(cache_path)
+    
+    def _attach_cache(self, cache_path: str):
+        """Validate an image cache against the loaded captions and use it."""
+        cache = np.load(cache_path, mmap_mode='r')
+        if cache.shape[0] != len(self._img_paths):
+            raise ValueError(
+                f"Image cache {cache_path} holds {cache.shape[0]} images, "
+                f"expected {len(self._img_paths)}"
+            )
+        self.image_cache_path = cache_path
+        self._image_cache = None
+    
+    def _load_image(self, path_idx: int):
+        """Load an image from the memmap cache, or decode it with PIL."""
+        if self.image_cache_path is not None:
+            if self._image_cache is None:
+                self._image_cache = np.load(self.image_cache_path, mmap_mode='r')
+            return torch.from_numpy(np.array(self._image_cache[path_idx]))
+        
+        image_path = self._img_paths[path_idx]
+        try:
+            return Image.open(image_path).convert('RGB')
+        except Exception as e:
+            logger.debug(f"Error loading image {image_path}: {e}")
+            # Return a black image as fallback
+            return Image.new('RGB', (224, 224), (0, 0, 0))
+    
+    def __getstate__(self):
+        # Never pickle the memmap into worker processes
+        state = self.__dict__.copy()
+        state['_image_cache'] = None
+        return state
     
     def __len__(self) -> int:
-        return len(self.data)
+        return len(self._img_path_idx)
     
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor, int]:
         """
@@ -118,27 +218,16 @@ class CaptionDataset(Dataset):
             caption: Encoded caption tensor
             caption_length: Length of caption (including special tokens)
         """
-        item = self.data[idx]
-        
         # Load and transform image
-        try:
-            image = Image.open(item['image_path']).convert('RGB')
-        except Exception as e:
-            print(f"Error loading image {item['image_path']}: {e}")
-            # Return a black image as fallback
-            image = Image.new('RGB', (224, 224), (0, 0, 0))
+        image = self._load_image(self._img_path_idx[idx])
         
         if self.transform:
             image = self.transform(image)
         
-        # Encode caption
-        caption_indices = self.vocabulary.encode(item['caption'], add_special_tokens=True)
-        
-        # Truncate if too long
-        if len(caption_indices) > self.max_length:
-            caption_indices = caption_indices[:self.max_length-1] + [self.vocabulary.end_idx]
-        
-        caption = torch.tensor(caption_indices, dtype=torch.long)
+        # Caption was encoded at load time; just slice the token buffer
+        caption = torch.from_numpy(
+            self._tokens[self._offsets[idx]:self._offsets[idx + 1]]
+        ).long()
         caption_length = len(caption)
         
         return image, caption, caption_length
@@ -178,6 +267,80 @@ def collate_fn(batch: List[Tuple], pad_idx: int = 0):
     return images, captions_padded, lengths
 
 
+class LengthBucketSampler(Sampler):
+    """
+    Batch sampler that groups captions of similar length to reduce padding.
+    
+    Indices are shuffled, split into buckets of bucket_size, sorted by length
+    within each bucket and chunked into batches; batch order is shuffled again.
+    """
+    
+    def __init__(
+        self,
+        lengths: np.ndarray,
+        batch_size: int,
+        bucket_size: Optional[int] = None,
+        shuffle: bool = True,
+        drop_last: bool = False
+    ):
+        """
+        Args:
+            lengths: (N,) caption lengths
+            batch_size: Samples per batch
+            bucket_size: Samples sorted together (default 50 * batch_size)
+            shuffle: Shuffle samples and batch order every epoch
+            drop_last: Drop incomplete batches
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size or 50 * batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+    
+    def __iter__(self) -> Iterator[List[int]]:
+        num_samples = len(self.lengths)
+        indices = np.random.permutation(num_samples) if self.shuffle else np.arange(num_samples)
+        
+        batches = []
+        for start in range(0, num_samples, self.bucket_size):
+            bucket = indices[start:start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            for b in range(0, len(bucket), self.batch_size):
+                batch = bucket[b:b + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+        
+        if self.shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+        
+        return iter(batches)
+    
+    def __len__(self) -> int:
+        # Every bucket, including the trailing partial one, is batched separately
+        full_buckets, remainder = divmod(len(self.lengths), self.bucket_size)
+        if self.drop_last:
+            return (full_buckets * (self.bucket_size // self.batch_size)
+                    + remainder // self.batch_size)
+        return (full_buckets * math.ceil(self.bucket_size / self.batch_size)
+                + math.ceil(remainder / self.batch_size))
+
+
+class CollateFn:
+    """Picklable collate_fn bound to a padding index (usable with spawned workers)."""
+    
+    def __init__(self, pad_idx: int = 0):
+        self.pad_idx = pad_idx
+    
+    def __call__(self, batch: List[Tuple]):
+        return collate_fn(batch, self.pad_idx)
+
+
+def image_cache_path(cache_dir: str, split: str, dataset_type: str, size: int) -> str:
+    """Location of the decoded-image memmap for a dataset split."""
+    return os.path.join(cache_dir, f'{split}_{dataset_type}_{size}.npy')
+
+
 def get_data_loaders(
     train_image_dir: str,
     train_captions_file: str,
@@ -188,18 +351,42 @@ def get_data_loaders(
     num_workers: int = 4,
     dataset_type: str = 'coco',
     image_size: int = 224,
-    max_length: int = 50
+    max_length: int = 50,
+    image_cache_dir: Optional[str] = None,
+    gpu_augment: bool = False,
+    bucket_size: Optional[int] = None,
+    persistent_workers: bool = True,
+    prefetch_factor: int = 4
 ) -> Tuple[DataLoader, DataLoader]:
     """
     Create train and validation data loaders.
     
+    Args:
+        image_cache_dir: If set, decoded images are cached there as uint8
+            memmaps (built on first use) and PIL decoding is skipped.
+        gpu_augment: Only resize training images on the CPU; crop, flip,
+            jitter and normalization are left to transforms.GPUAugmentation.
+        bucket_size: Training samples sorted by length together before
+            batching (see LengthBucketSampler); validation is not bucketed.
+        persistent_workers: Keep workers alive across epochs (num_workers > 0)
+        prefetch_factor: Batches loaded in advance by each worker
+    
     Returns:
         train_loader: Training DataLoader
         val_loader: Validation DataLoader
     """
-    # Get transforms
-    train_transform = get_transforms('train', image_size)
-    val_transform = get_transforms('val', image_size)
+    use_cache = image_cache_dir is not None
+    
+    # Get transforms (uint8 output; CaptioningModel normalizes on device)
+    if gpu_augment:
+        train_transform = None if use_cache else get_transforms_minimal(image_size)
+    else:
+        train_transform = get_transforms(
+            'train', image_size, pre_resized=use_cache, device_normalize=True
+        )
+    val_transform = get_transforms(
+        'val', image_size, pre_resized=use_cache, device_normalize=True
+    )
     
     # Create datasets
     train_dataset = CaptionDataset(
@@ -220,14 +407,36 @@ def get_data_loaders(
         dataset_type
     )
     
-    # Create data loaders
+    if use_cache:
+        os.makedirs(image_cache_dir, exist_ok=True)
+        # Training images keep a margin for RandomCrop, as in get_transforms
+        for split, dataset, size in (
+            ('train', train_dataset, image_size + 32),
+            ('val', val_dataset, image_size)
+        ):
+            cache_path = image_cache_path(image_cache_dir, split, dataset_type, size)
+            if os.path.exists(cache_path):
+                dataset._attach_cache(cache_path)
+            else:
+                dataset.build_cache(cache_path, size)
+    
+    # Keep workers (and their loaded caption arrays) alive across epochs
+    collate = CollateFn(vocabulary.pad_idx)
+    worker_kwargs = {}
+    if num_workers > 0:
+        worker_kwargs = {
+            'persistent_workers': persistent_workers,
+            'prefetch_factor': prefetch_factor
+        }
+    
+    # Create data loaders (training batches are length-bucketed)
     train_loader = DataLoader(
         train_dataset,
-        batch_size=batch_size,
-        shuffle=True,
+        batch_sampler=LengthBucketSampler(train_dataset.lengths, batch_size, bucket_size),
         num_workers=num_workers,
-        collate_fn=lambda x: collate_fn(x, vocabulary.pad_idx),
-        pin_memory=True
+        collate_fn=collate,
+        pin_memory=True,
+        **worker_kwargs
     )
     
     val_loader = DataLoader(
@@ -235,8 +444,9 @@ def get_data_loaders(
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers,
-        collate_fn=lambda x: collate_fn(x, vocabulary.pad_idx),
-        pin_memory=True
+        collate_fn=collate,
+        pin_memory=True,
+        **worker_kwargs
     )
     
     return train_loader, val_loader
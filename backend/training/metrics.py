@@ -3,9 +3,11 @@ Evaluation metrics for image captioning.
 Implements BLEU, METEOR, CIDEr, and ROUGE-L.
 """
 
+import math
+import sys
 import numpy as np
 from typing import List, Dict
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 # Download required NLTK data
 import nltk
@@ -14,9 +16,178 @@ try:
 except LookupError:
     nltk.download('punkt', quiet=True)
 
-from nltk.translate.bleu_score import corpus_bleu, sentence_bleu
+from nltk.translate.bleu_score import sentence_bleu
 from nltk.translate.meteor_score import meteor_score
 
+# Optional C++ LCS kernel (pip install lcsvec); falls back to llcs_bitparallel
+try:
+    from lcsvec import lcs_length as lcsvec_lcs_length
+    LCSVEC_AVAILABLE = True
+except ImportError:
+    LCSVEC_AVAILABLE = False
+
+def llcs_bitparallel(pred_tokens: List, ref_tokens: List) -> int:
+    """
+    Length of the longest common subsequence (Hyyro bit-parallel LLCS).
+    
+    Each distinct prediction token gets a bitmask of its positions; every
+    reference token then updates the whole DP row with a few integer ops.
+    Python ints act as arbitrary-width bit vectors, so any length works.
+    
+    Args:
+        pred_tokens: Predicted tokens
+        ref_tokens: Reference tokens
+        
+    Returns:
+        length: LCS length
+    """
+    m = len(pred_tokens)
+    if m == 0 or len(ref_tokens) == 0:
+        return 0
+    
+    positions = {}
+    for i, token in enumerate(pred_tokens):
+        positions[token] = positions.get(token, 0) | (1 << i)
+    
+    mask = (1 << m) - 1
+    row = mask
+    for token in ref_tokens:
+        matches = row & positions.get(token, 0)
+        row = ((row + matches) | (row - matches)) & mask
+    
+    # Zero bits mark matched positions
+    return m - row.bit_count()
+
+
+def _corpus_bleu_all(
+    list_of_references: List[List[List]],
+    hypotheses: List[List],
+    max_n: int = 4
+) -> List[float]:
+    """
+    Corpus BLEU-1..BLEU-max_n from a single n-gram counting pass.
+    
+    Matches nltk's corpus_bleu with uniform weights and no smoothing:
+    clipped n-gram counts and per-sentence denominators are summed over the
+    corpus, with a brevity penalty from the closest reference lengths.
+    
+    Args:
+        list_of_references: Reference token lists per hypothesis
+        hypotheses: Hypothesis token lists
+        max_n: Highest n-gram order
+        
+    Returns:
+        scores: [BLEU-1, ..., BLEU-max_n]
+    """
+    numerators = [0] * (max_n + 1)
+    denominators = [0] * (max_n + 1)
+    hyp_length = 0
+    ref_length = 0
+    
+    for references, hypothesis in zip(list_of_references, hypotheses):
+        hyp_len = len(hypothesis)
+        hyp_length += hyp_len
+        ref_length += min(
+            (len(ref) for ref in references),
+            key=lambda ref_len: (abs(ref_len - hyp_len), ref_len)
+        )
+        
+        for n in range(1, max_n + 1):
+            counts = Counter(zip(*(hypothesis[i:] for i in range(n))))
+            if not counts:
+                denominators[n] += 1
+                continue
+            
+            # Clip by the maximum count in any single reference
+            max_ref_counts = {}
+            for ref in references:
+                for ngram, count in Counter(zip(*(ref[i:] for i in range(n)))).items():
+                    if count > max_ref_counts.get(ngram, 0):
+                        max_ref_counts[ngram] = count
+            
+            numerators[n] += sum(
+                min(count, max_ref_counts.get(ngram, 0)) for ngram, count in counts.items()
+            )
+            denominators[n] += sum(counts.values())
+    
+    # No unigram matches at all
+    if numerators[1] == 0:
+        return [0.0] * max_n
+    
+    # Brevity penalty
+    if hyp_length > ref_length:
+        bp = 1.0
+    elif hyp_length == 0:
+        bp = 0.0
+    else:
+        bp = math.exp(1 - ref_length / hyp_length)
+    
+    # Zero precisions become float_info.min, like nltk's default smoothing
+    log_precisions = [
+        math.log(numerators[n] / denominators[n]) if numerators[n] > 0
+        else math.log(sys.float_info.min)
+        for n in range(1, max_n + 1)
+    ]
+    
+    scores = []
+    cumulative = 0.0
+    for k in range(1, max_n + 1):
+        cumulative += log_precisions[k - 1]
+        scores.append(bp * math.exp(cumulative / k))
+    return scores
+
+
+def meteor_exact(
+    pred_tokens: List,
+    ref_tokens: List,
+    alpha: float = 0.9,
+    beta: float = 3.0,
+    gamma: float = 0.5
+) -> float:
+    """
+    METEOR restricted to exact unigram matches (no stemming or WordNet).
+    
+    Alignment, F-mean and fragmentation penalty follow nltk's
+    single_meteor_score, so scores agree with it whenever no stem or
+    synonym matches would apply. Works on words or interned token ids.
+    
+    Args:
+        pred_tokens: Predicted tokens
+        ref_tokens: Reference tokens
+        alpha: Relative weight of precision vs recall
+        beta: Shape of the fragmentation penalty
+        gamma: Weight of the fragmentation penalty
+        
+    Returns:
+        score: Sentence-level METEOR
+    """
+    # Each prediction token (from the end) takes the last unused equal ref token
+    positions = defaultdict(list)
+    for j, tok in enumerate(ref_tokens):
+        positions[tok].append(j)
+    
+    matches = []
+    for i in range(len(pred_tokens) - 1, -1, -1):
+        free = positions.get(pred_tokens[i])
+        if free:
+            matches.append((i, free.pop()))
+    
+    if not matches:
+        return 0.0
+    matches.reverse()
+    
+    chunks = 1
+    for (i0, j0), (i1, j1) in zip(matches, matches[1:]):
+        if i1 != i0 + 1 or j1 != j0 + 1:
+            chunks += 1
+    
+    num_matches = len(matches)
+    precision = num_matches / len(pred_tokens)
+    recall = num_matches / len(ref_tokens)
+    fmean = (precision * recall) / (alpha * precision + (1 - alpha) * recall)
+    penalty = gamma * (chunks / num_matches) ** beta
+    return (1 - penalty) * fmean
+
 
 class CaptionMetrics:
     """Compute multiple metrics for caption evaluation."""
@@ -28,6 +199,16 @@ class CaptionMetrics:
         """Reset stored predictions and references."""
         self.predictions = []
         self.references = []
+        
+        # Captions are tokenized once in update() and interned to small ints
+        self._vocab = {}
+        self._pred_tok = []
+        self._ref_tok = []
+    
+    def _tok(self, text: str) -> List[int]:
+        """Split text on whitespace and intern each word to an id."""
+        vocab = self._vocab
+        return [vocab.setdefault(w, len(vocab)) for w in text.split()]
     
     def update(self, predictions: List[str], references: List[List[str]]):
         """
@@ -39,6 +220,8 @@ class CaptionMetrics:
         """
         self.predictions.extend(predictions)
         self.references.extend(references)
+        self._pred_tok.extend(self._tok(pred) for pred in predictions)
+        self._ref_tok.extend([self._tok(ref) for ref in refs] for refs in references)
     
     def compute_bleu(self, n: int = 4) -> Dict[str, float]:
         """
@@ -50,36 +233,39 @@ class CaptionMetrics:
         Returns:
             scores: Dictionary with BLEU-1 to BLEU-n
         """
-        # Tokenize
-        tokenized_preds = [pred.split() for pred in self.predictions]
-        tokenized_refs = [[ref.split() for ref in refs] for refs in self.references]
-        
-        scores = {}
-        
-        # BLEU-1 to BLEU-4
-        for i in range(1, n + 1):
-            weights = [1.0 / i] * i + [0] * (4 - i)
-            score = corpus_bleu(
-                tokenized_refs,
-                tokenized_preds,
-                weights=weights
-            )
-            scores[f'BLEU-{i}'] = score
+        # BLEU-1 to BLEU-n in one pass (token ids work as well as words)
+        bleu = _corpus_bleu_all(self._ref_tok, self._pred_tok, max_n=n)
         
-        return scores
+        return {f'BLEU-{i}': score for i, score in enumerate(bleu, start=1)}
     
-    def compute_meteor(self) -> float:
+    def compute_meteor(self, fast: bool = False) -> float:
         """
         Compute METEOR score.
         
+        Args:
+            fast: Exact matches only (meteor_exact on token ids), skipping
+                the stemmer and WordNet; meant for per-epoch monitoring
+        
         Returns:
             score: Average METEOR score
         """
+        if fast:
+            return np.mean([
+                meteor_exact(pred, refs[0])
+                for pred, refs in zip(self._pred_tok, self._ref_tok)
+            ])
+        
         scores = []
         
-        for pred, refs in zip(self.predictions, self.references):
+        # METEOR needs words (stemming/synonyms); ids index insertion order
+        words = list(self._vocab)
+        
+        for pred, refs in zip(self._pred_tok, self._ref_tok):
             # METEOR uses first reference by default
-            score = meteor_score([refs[0].split()], pred.split())
+            score = meteor_score(
+                [[words[i] for i in refs[0]]],
+                [words[i] for i in pred]
+            )
             scores.append(score)
         
         return np.mean(scores)
@@ -91,39 +277,31 @@ class CaptionMetrics:
         Returns:
             score: Average ROUGE-L F1
         """
-        def lcs_length(x, y):
-            """Compute longest common subsequence length."""
-            m, n = len(x), len(y)
-            dp = [[0] * (n + 1) for _ in range(m + 1)]
-            
-            for i in range(1, m + 1):
-                for j in range(1, n + 1):
-                    if x[i-1] == y[j-1]:
-                        dp[i][j] = dp[i-1][j-1] + 1
-                    else:
-                        dp[i][j] = max(dp[i-1][j], dp[i][j-1])
-            
-            return dp[m][n]
-        
         scores = []
         
-        for pred, refs in zip(self.predictions, self.references):
-            pred_tokens = pred.split()
+        for pred_tokens, refs in zip(self._pred_tok, self._ref_tok):
+            # Everything about the prediction is computed once, not per reference
+            pred_len = len(pred_tokens)
+            if pred_len == 0:
+                scores.append(0.0)
+                continue
+            if LCSVEC_AVAILABLE:
+                pred_ids = np.asarray(pred_tokens, dtype=np.int64)
             
             # Use best matching reference
             best_score = 0
-            for ref in refs:
-                ref_tokens = ref.split()
-                
-                lcs_len = lcs_length(pred_tokens, ref_tokens)
-                
-                if len(pred_tokens) == 0 or len(ref_tokens) == 0:
+            for ref_tokens in refs:
+                if len(ref_tokens) == 0:
                     continue
                 
-                precision = lcs_len / len(pred_tokens) if len(pred_tokens) > 0 else 0
-                recall = lcs_len / len(ref_tokens) if len(ref_tokens) > 0 else 0
+                if LCSVEC_AVAILABLE:
+                    lcs_len = lcsvec_lcs_length(pred_ids, np.asarray(ref_tokens, dtype=np.int64))
+                else:
+                    lcs_len = llcs_bitparallel(pred_tokens, ref_tokens)
                 
-                if precision + recall > 0:
+                if lcs_len > 0:
+                    precision = lcs_len / pred_len
+                    recall = lcs_len / len(ref_tokens)
                     f1 = 2 * precision * recall / (precision + recall)
                     best_score = max(best_score, f1)
             
@@ -131,10 +309,13 @@ class CaptionMetrics:
         
         return np.mean(scores)
     
-    def compute_all(self) -> Dict[str, float]:
+    def compute_all(self, fast_meteor: bool = False) -> Dict[str, float]:
         """
         Compute all metrics.
         
+        Args:
+            fast_meteor: Use exact-match METEOR (see compute_meteor)
+        
         Returns:
             metrics: Dictionary with all scores
         """
@@ -145,7 +326,7 @@ class CaptionMetrics:
         metrics.update(bleu_scores)
         
         # METEOR
-        metrics['METEOR'] = self.compute_meteor()
+        metrics['METEOR'] = self.compute_meteor(fast=fast_meteor)
         
         # ROUGE-L
         metrics['ROUGE-L'] = self.compute_rouge_l()
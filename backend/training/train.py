@@ -5,6 +5,9 @@ Main training script.
 import os
 import argparse
 import json
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
 import torch
 import torch.nn as nn
 from loguru import logger
@@ -13,66 +16,169 @@ from models.captioning_model import CaptioningModel
 from training.vocabulary import Vocabulary
 from training.dataset import get_data_loaders
 from training.trainer import Trainer
+from training.transforms import GPUAugmentation
+
+
+@dataclass
+class TrainConfig:
+    """Training configuration; field names match the command line options."""
+    
+    # Data
+    train_image_dir: str
+    train_captions: str
+    val_image_dir: str
+    val_captions: str
+    dataset_type: str = 'coco'
+    
+    # Model
+    embed_dim: int = 512
+    num_heads: int = 8
+    num_layers: int = 6
+    ff_dim: int = 2048
+    dropout: float = 0.1
+    max_seq_len: int = 52
+    fine_tune_encoder: bool = False
+    fine_tune_layers: int = 2
+    
+    # Vocabulary
+    vocab_threshold: int = 5
+    max_vocab_size: Optional[int] = None
+    vocab_path: Optional[str] = None
+    
+    # Training
+    batch_size: int = 32
+    num_epochs: int = 20
+    learning_rate: float = 3e-4
+    encoder_lr: float = 1e-4
+    weight_decay: float = 0.0
+    gradient_clip: float = 5.0
+    label_smoothing: float = 0.0
+    num_workers: int = 4
+    image_cache_dir: Optional[str] = None
+    gpu_augment: bool = False
+    bucket_size: Optional[int] = None
+    persistent_workers: bool = True
+    prefetch_factor: int = 4
+    
+    # Optimization
+    use_amp: bool = False
+    compile: bool = False
+    scheduler: str = 'plateau'
+    early_stopping: int = 5
+    
+    # Checkpointing
+    checkpoint_dir: str = 'checkpoints'
+    log_interval: int = 100
+    save_best_only: bool = False
+    
+    # Resume
+    resume: Optional[str] = None
+    
+    # Device
+    device: str = field(default_factory=lambda: 'cuda' if torch.cuda.is_available() else 'cpu')
+    
+    # Random seed
+    seed: int = 42
+    deterministic: bool = False
+    
+    def __post_init__(self):
+        # Accept pathlib.Path for every path option
+        for name in ('train_image_dir', 'train_captions', 'val_image_dir', 'val_captions',
+                     'vocab_path', 'image_cache_dir', 'checkpoint_dir', 'resume'):
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, os.fspath(value))
 
 
-def parse_args():
-    """Parse command line arguments."""
-    parser = argparse.ArgumentParser(description='Train Image Captioning Model')
+def parse_args(argv: Optional[List[str]] = None) -> TrainConfig:
+    """
+    Parse command line arguments into a TrainConfig.
+    
+    Options that aren't given are left out of the namespace, so the
+    defaults come from TrainConfig alone.
+    """
+    parser = argparse.ArgumentParser(
+        description='Train Image Captioning Model',
+        argument_default=argparse.SUPPRESS
+    )
     
     # Data
     parser.add_argument('--train_image_dir', type=str, required=True, help='Training images directory')
     parser.add_argument('--train_captions', type=str, required=True, help='Training captions file')
     parser.add_argument('--val_image_dir', type=str, required=True, help='Validation images directory')
     parser.add_argument('--val_captions', type=str, required=True, help='Validation captions file')
-    parser.add_argument('--dataset_type', type=str, default='coco', choices=['coco', 'flickr8k'])
+    parser.add_argument('--dataset_type', type=str, choices=['coco', 'flickr8k'])
     
     # Model
-    parser.add_argument('--embed_dim', type=int, default=512)
-    parser.add_argument('--num_heads', type=int, default=8)
-    parser.add_argument('--num_layers', type=int, default=6)
-    parser.add_argument('--ff_dim', type=int, default=2048)
-    parser.add_argument('--dropout', type=float, default=0.1)
-    parser.add_argument('--max_seq_len', type=int, default=52)
+    parser.add_argument('--embed_dim', type=int)
+    parser.add_argument('--num_heads', type=int)
+    parser.add_argument('--num_layers', type=int)
+    parser.add_argument('--ff_dim', type=int)
+    parser.add_argument('--dropout', type=float)
+    parser.add_argument('--max_seq_len', type=int)
     parser.add_argument('--fine_tune_encoder', action='store_true')
-    parser.add_argument('--fine_tune_layers', type=int, default=2)
+    parser.add_argument('--fine_tune_layers', type=int)
     
     # Vocabulary
-    parser.add_argument('--vocab_threshold', type=int, default=5)
-    parser.add_argument('--vocab_path', type=str, default=None, help='Path to existing vocabulary')
+    parser.add_argument('--vocab_threshold', type=int)
+    parser.add_argument('--max_vocab_size', type=int,
+                        help='Keep only the most frequent words (special tokens excluded)')
+    parser.add_argument('--vocab_path', type=str, help='Path to existing vocabulary')
     
     # Training
-    parser.add_argument('--batch_size', type=int, default=32)
-    parser.add_argument('--num_epochs', type=int, default=20)
-    parser.add_argument('--learning_rate', type=float, default=3e-4)
-    parser.add_argument('--encoder_lr', type=float, default=1e-4)
-    parser.add_argument('--weight_decay', type=float, default=0.0)
-    parser.add_argument('--gradient_clip', type=float, default=5.0)
-    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--batch_size', type=int)
+    parser.add_argument('--num_epochs', type=int)
+    parser.add_argument('--learning_rate', type=float)
+    parser.add_argument('--encoder_lr', type=float)
+    parser.add_argument('--weight_decay', type=float)
+    parser.add_argument('--gradient_clip', type=float)
+    parser.add_argument('--label_smoothing', type=float)
+    parser.add_argument('--num_workers', type=int)
+    parser.add_argument('--image_cache_dir', type=str,
+                        help='Cache decoded, resized images as uint8 memmaps in this directory')
+    parser.add_argument('--gpu_augment', action='store_true',
+                        help='Run training augmentation on the device with kornia')
+    parser.add_argument('--bucket_size', type=int,
+                        help='Samples sorted by caption length per bucket (default 50 * batch_size)')
+    parser.add_argument('--no_persistent_workers', dest='persistent_workers', action='store_false',
+                        help='Respawn DataLoader workers every epoch')
+    parser.add_argument('--prefetch_factor', type=int,
+                        help='Batches prefetched per DataLoader worker')
     
     # Optimization
     parser.add_argument('--use_amp', action='store_true', help='Use mixed precision training')
-    parser.add_argument('--scheduler', type=str, default='plateau', choices=['plateau', 'cosine', 'none'])
-    parser.add_argument('--early_stopping', type=int, default=5)
+    parser.add_argument('--compile', action='store_true', help='Compile the model with torch.compile (CUDA only)')
+    parser.add_argument('--scheduler', type=str, choices=['plateau', 'cosine', 'none'])
+    parser.add_argument('--early_stopping', type=int)
     
     # Checkpointing
-    parser.add_argument('--checkpoint_dir', type=str, default='checkpoints')
-    parser.add_argument('--log_interval', type=int, default=100)
+    parser.add_argument('--checkpoint_dir', type=str)
+    parser.add_argument('--log_interval', type=int)
     parser.add_argument('--save_best_only', action='store_true')
     
     # Resume
-    parser.add_argument('--resume', type=str, default=None, help='Path to checkpoint to resume from')
+    parser.add_argument('--resume', type=str, help='Path to checkpoint to resume from')
     
     # Device
-    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('--device', type=str)
     
     # Random seed
-    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--deterministic', action='store_true',
+                        help='Use deterministic cuDNN kernels and disable TF32 (slower)')
     
-    return parser.parse_args()
+    return TrainConfig(**vars(parser.parse_args(argv)))
 
 
-def set_seed(seed: int):
-    """Set random seeds for reproducibility."""
+def set_seed(seed: int, deterministic: bool = False):
+    """
+    Set random seeds for reproducibility.
+    
+    Args:
+        seed: Seed for python, numpy and torch RNGs
+        deterministic: Force deterministic cuDNN kernels; otherwise let the
+            cuDNN autotuner pick the fastest convolutions
+    """
     import random
     import numpy as np
     
@@ -80,8 +186,8 @@ def set_seed(seed: int):
     np.random.seed(seed)
     torch.manual_seed(seed)
     torch.cuda.manual_seed_all(seed)
-    torch.backends.cudnn.deterministic = True
-    torch.backends.cudnn.benchmark = False
+    torch.backends.cudnn.deterministic = deterministic
+    torch.backends.cudnn.benchmark = not deterministic
 
 
 def build_vocabulary(args):
@@ -111,7 +217,7 @@ def build_vocabulary(args):
                         if len(parts) == 2:
                             captions.append(parts[1])
         
-        vocabulary.build_vocabulary(captions)
+        vocabulary.build_vocabulary(captions, max_vocab_size=args.max_vocab_size)
         
         # Save vocabulary
         vocab_save_path = os.path.join(args.checkpoint_dir, 'vocab.json')
@@ -121,16 +227,25 @@ def build_vocabulary(args):
     return vocabulary
 
 
-def main():
-    """Main training function."""
-    args = parse_args()
+def run(args: TrainConfig):
+    """
+    Train a model.
     
+    Args:
+        args: Training configuration
+    """
     # Set seed
-    set_seed(args.seed)
+    set_seed(args.seed, args.deterministic)
+    
+    # TF32 tensor cores for fp32 matmuls/convolutions (Ampere+)
+    if not args.deterministic:
+        torch.set_float32_matmul_precision('high')
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
     
     # Setup logging
     logger.add(os.path.join(args.checkpoint_dir, 'training.log'))
-    logger.info(f"Arguments: {vars(args)}")
+    logger.info(f"Arguments: {asdict(args)}")
     
     # Build vocabulary
     vocabulary = build_vocabulary(args)
@@ -147,7 +262,12 @@ def main():
         args.batch_size,
         args.num_workers,
         args.dataset_type,
-        max_length=args.max_seq_len
+        max_length=args.max_seq_len,
+        image_cache_dir=args.image_cache_dir,
+        gpu_augment=args.gpu_augment,
+        bucket_size=args.bucket_size,
+        persistent_workers=args.persistent_workers,
+        prefetch_factor=args.prefetch_factor
     )
     
     # Create model
@@ -170,23 +290,36 @@ def main():
     
     logger.info(f"Model parameters: {sum(p.numel() for p in model.parameters()) / 1e6:.2f}M")
     
+    # Compile the forward pass; caption length varies per batch, so let
+    # Inductor mark the sequence dimension dynamic instead of using CUDA graphs
+    if args.compile and device.type == 'cuda' and hasattr(torch, 'compile'):
+        logger.info("Compiling model with torch.compile")
+        model = torch.compile(model)
+    
     # Create optimizer with different learning rates for encoder and decoder
     trainable_params = model.get_trainable_parameters()
     
+    # Fused AdamW kernels need CUDA parameters
+    fused = device.type == 'cuda'
+    
     if args.fine_tune_encoder and len(trainable_params['encoder']) > 0:
         optimizer = torch.optim.AdamW([
             {'params': trainable_params['encoder'], 'lr': args.encoder_lr},
             {'params': trainable_params['decoder'], 'lr': args.learning_rate}
-        ], weight_decay=args.weight_decay)
+        ], weight_decay=args.weight_decay, fused=fused)
     else:
         optimizer = torch.optim.AdamW(
             trainable_params['decoder'],
             lr=args.learning_rate,
-            weight_decay=args.weight_decay
+            weight_decay=args.weight_decay,
+            fused=fused
         )
     
     # Create loss function
-    criterion = nn.CrossEntropyLoss(ignore_index=vocabulary.pad_idx)
+    criterion = nn.CrossEntropyLoss(
+        ignore_index=vocabulary.pad_idx,
+        label_smoothing=args.label_smoothing
+    )
     
     # Create scheduler
     scheduler = None
@@ -199,6 +332,11 @@ def main():
             optimizer, T_max=args.num_epochs
         )
     
+    # On-device training augmentation
+    train_augment = None
+    if args.gpu_augment:
+        train_augment = GPUAugmentation(image_size=224).to(device)
+    
     # Create trainer
     trainer = Trainer(
         model=model,
@@ -212,7 +350,8 @@ def main():
         log_interval=args.log_interval,
         use_amp=args.use_amp,
         gradient_clip=args.gradient_clip,
-        scheduler=scheduler
+        scheduler=scheduler,
+        train_augment=train_augment
     )
     
     # Resume from checkpoint if specified
@@ -230,5 +369,10 @@ def main():
     logger.info("Training finished!")
 
 
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    run(parse_args(argv))
+
+
 if __name__ == '__main__':
     main()
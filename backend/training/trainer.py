@@ -5,16 +5,38 @@ Training loop with mixed precision, gradient clipping, and checkpointing.
 import os
 import time
 import json
-from typing import Dict, Optional
+import copy
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
 import torch
 import torch.nn as nn
-from torch.cuda.amp import autocast, GradScaler
+from torch.cuda.amp import GradScaler
 from torch.utils.data import DataLoader
 from loguru import logger
 
 from .metrics import CaptionMetrics
 
 
+def _to_cpu(obj: Any) -> Any:
+    """Recursively copy tensors in a (nested) state dict to CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return copy.deepcopy(obj)
+
+
+def _atomic_save(obj: Any, path: str):
+    """torch.save to a temporary file, then atomically move it into place."""
+    tmp_path = path + '.tmp'
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved checkpoint: {path}")
+
+
 class Trainer:
     """Trainer for image captioning models."""
     
@@ -31,7 +53,8 @@ class Trainer:
         log_interval: int = 100,
         use_amp: bool = True,
         gradient_clip: float = 5.0,
-        scheduler: Optional[torch.optim.lr_scheduler._LRScheduler] = None
+        scheduler: Optional[torch.optim.lr_scheduler._LRScheduler] = None,
+        train_augment: Optional[nn.Module] = None
     ):
         """
         Args:
@@ -47,6 +70,8 @@ class Trainer:
             use_amp: Use automatic mixed precision
             gradient_clip: Gradient clipping threshold
             scheduler: Learning rate scheduler
+            train_augment: Optional on-device augmentation applied to training
+                batches (e.g. transforms.GPUAugmentation)
         """
         self.model = model
         self.train_loader = train_loader
@@ -60,13 +85,25 @@ class Trainer:
         self.use_amp = use_amp
         self.gradient_clip = gradient_clip
         self.scheduler = scheduler
+        self.train_augment = train_augment
         
-        # Mixed precision scaler
-        self.scaler = GradScaler() if use_amp else None
+        # Parameters to clip, collected once (multi-tensor clipping below)
+        self._params = [p for p in model.parameters() if p.requires_grad]
+        
+        # Mixed precision: bf16 needs no loss scaling; fp16 only on GPUs without bf16
+        self._amp_dtype = torch.bfloat16
+        if self.device.type == 'cuda' and not torch.cuda.is_bf16_supported():
+            self._amp_dtype = torch.float16
+        self.scaler = GradScaler() if use_amp and self._amp_dtype == torch.float16 else None
         
         # Create checkpoint directory
         os.makedirs(checkpoint_dir, exist_ok=True)
         
+        # Checkpoints are written by a background thread so training continues
+        self._ckpt_executor = ThreadPoolExecutor(max_workers=1)
+        self._ckpt_futures = []
+        atexit.register(self._ckpt_executor.shutdown, wait=True)
+        
         # Training history
         self.history = {
             'train_loss': [],
@@ -91,70 +128,84 @@ class Trainer:
             avg_loss: Average training loss
         """
         self.model.train()
-        total_loss = 0
+        # Losses accumulate on device; only logging reads them back
+        total_loss = torch.zeros((), device=self.device)
+        window_loss = torch.zeros((), device=self.device)
+        window_batches = 0
         start_time = time.time()
         
         for batch_idx, (images, captions, lengths) in enumerate(self.train_loader):
-            # Move to device
-            images = images.to(self.device)
-            captions = captions.to(self.device)
-            lengths = lengths.to(self.device)
+            # Move to device (async from pinned memory)
+            images = images.to(self.device, non_blocking=True)
+            if self.train_augment is not None:
+                images = self.train_augment(images)
+            images = images.contiguous(memory_format=torch.channels_last)
+            captions = captions.to(self.device, non_blocking=True)
+            lengths = lengths.to(self.device, non_blocking=True)
             
             # Forward pass with mixed precision
-            self.optimizer.zero_grad()
+            self.optimizer.zero_grad(set_to_none=True)
             
-            if self.use_amp:
-                with autocast():
-                    # Model forward
-                    outputs = self.model(images, captions[:, :-1])  # Teacher forcing
-                    
-                    # Compute loss
-                    targets = captions[:, 1:]  # Shift targets
-                    loss = self._compute_loss(outputs, targets, lengths - 1)
+            with torch.amp.autocast(
+                device_type=self.device.type,
+                dtype=self._amp_dtype,
+                enabled=self.use_amp
+            ):
+                # Model forward
+                outputs = self.model(images, captions[:, :-1])  # Teacher forcing
                 
-                # Backward pass with gradient scaling
+                # Compute loss
+                targets = captions[:, 1:]  # Shift targets
+                loss = self._compute_loss(outputs, targets, lengths - 1)
+            
+            if self.scaler is not None:
+                # Backward pass with gradient scaling (fp16)
                 self.scaler.scale(loss).backward()
                 
                 # Gradient clipping
                 if self.gradient_clip > 0:
                     self.scaler.unscale_(self.optimizer)
                     torch.nn.utils.clip_grad_norm_(
-                        self.model.parameters(),
-                        self.gradient_clip
+                        self._params,
+                        self.gradient_clip,
+                        foreach=True
                     )
                 
                 # Optimizer step
                 self.scaler.step(self.optimizer)
                 self.scaler.update()
             else:
-                # Standard training
-                outputs = self.model(images, captions[:, :-1])
-                targets = captions[:, 1:]
-                loss = self._compute_loss(outputs, targets, lengths - 1)
-                
+                # Full precision or bf16: no scaling needed
                 loss.backward()
                 
                 if self.gradient_clip > 0:
                     torch.nn.utils.clip_grad_norm_(
-                        self.model.parameters(),
-                        self.gradient_clip
+                        self._params,
+                        self.gradient_clip,
+                        foreach=True
                     )
                 
                 self.optimizer.step()
             
-            total_loss += loss.item()
+            loss = loss.detach()
+            total_loss += loss
+            window_loss += loss
+            window_batches += 1
             
             # Logging
             if (batch_idx + 1) % self.log_interval == 0:
-                avg_loss = total_loss / (batch_idx + 1)
+                avg_loss = total_loss.item() / (batch_idx + 1)
+                recent_loss = window_loss.item() / window_batches
+                window_loss.zero_()
+                window_batches = 0
                 elapsed = time.time() - start_time
                 logger.info(
                     f"Epoch [{epoch}] Batch [{batch_idx + 1}/{len(self.train_loader)}] "
-                    f"Loss: {loss.item():.4f} | Avg Loss: {avg_loss:.4f} | "
+                    f"Loss: {recent_loss:.4f} | Avg Loss: {avg_loss:.4f} | "
                     f"Time: {elapsed:.2f}s"
                 )
         
-        avg_loss = total_loss / len(self.train_loader)
+        avg_loss = total_loss.item() / len(self.train_loader)
         return avg_loss
     
     def validate(self, epoch: int) -> tuple[float, Dict[str, float]]:
@@ -169,47 +220,55 @@ class Trainer:
             metrics: Evaluation metrics
         """
         self.model.eval()
-        total_loss = 0
+        total_loss = torch.zeros((), device=self.device)
         
-        # Metrics
-        metrics_evaluator = CaptionMetrics()
+        # Generated/reference ids stay on device until the loop is done
+        pending_pred_ids = []
+        pending_ref_ids = []
+        num_pending = 0
         
         with torch.no_grad():
             for images, captions, lengths in self.val_loader:
-                images = images.to(self.device)
-                captions = captions.to(self.device)
-                lengths = lengths.to(self.device)
+                images = images.to(self.device, non_blocking=True)
+                images = images.contiguous(memory_format=torch.channels_last)
+                captions = captions.to(self.device, non_blocking=True)
+                lengths = lengths.to(self.device, non_blocking=True)
                 
                 # Forward pass
                 outputs = self.model(images, captions[:, :-1])
                 targets = captions[:, 1:]
                 loss = self._compute_loss(outputs, targets, lengths - 1)
                 
-                total_loss += loss.item()
+                total_loss += loss
                 
                 # Generate captions for metrics (sample a few)
-                if len(metrics_evaluator.predictions) < 500:  # Limit for speed
-                    for i in range(min(4, images.size(0))):
-                        # Generate caption
-                        pred_caption = self.model.generate_caption(
-                            images[i:i+1],
-                            self.vocabulary.start_idx,
-                            self.vocabulary.end_idx,
-                            max_len=50,
-                            method='greedy'
-                        )
-                        
-                        # Decode
-                        pred_text = self.vocabulary.decode(pred_caption.tolist())
-                        ref_text = self.vocabulary.decode(captions[i].tolist())
-                        
-                        # Update metrics
-                        metrics_evaluator.update([pred_text], [[ref_text]])
-        
-        avg_loss = total_loss / len(self.val_loader)
-        
-        # Compute metrics
-        metrics = metrics_evaluator.compute_all() if len(metrics_evaluator.predictions) > 0 else {}
+                if num_pending < 500:  # Limit for speed
+                    # Generate captions for the first few images in one batch
+                    num_samples = min(4, images.size(0))
+                    pending_pred_ids.append(self.model.generate_captions_batch(
+                        images[:num_samples],
+                        self.vocabulary.start_idx,
+                        self.vocabulary.end_idx,
+                        max_len=50,
+                        method='greedy'
+                    ))
+                    pending_ref_ids.append(captions[:num_samples])
+                    num_pending += num_samples
+        
+        avg_loss = total_loss.item() / len(self.val_loader)
+        
+        # Decode and score all sampled captions in one pass
+        metrics_evaluator = CaptionMetrics()
+        for pred_ids, ref_ids in zip(pending_pred_ids, pending_ref_ids):
+            pred_texts = [self.vocabulary.decode(ids) for ids in pred_ids.tolist()]
+            ref_texts = [[self.vocabulary.decode(ids)] for ids in ref_ids.tolist()]
+            metrics_evaluator.update(pred_texts, ref_texts)
+        
+        # Compute metrics (exact-match METEOR is enough for per-epoch monitoring)
+        metrics = (
+            metrics_evaluator.compute_all(fast_meteor=True)
+            if len(metrics_evaluator.predictions) > 0 else {}
+        )
         
         logger.info(f"Validation - Epoch [{epoch}] Loss: {avg_loss:.4f}")
         if metrics:
@@ -234,11 +293,11 @@ class Trainer:
         Returns:
             loss: Scalar loss
         """
-        batch_size, seq_len, vocab_size = outputs.shape
-        
-        # Reshape for cross entropy
-        outputs = outputs.reshape(-1, vocab_size)
-        targets = targets.reshape(-1)
+        # Flatten for cross entropy; both are contiguous, so these are views.
+        # (Transposing to (B, vocab, seq) instead would make the class
+        # dimension strided and send cross_entropy down a slower path.)
+        outputs = outputs.flatten(0, 1)
+        targets = targets.flatten()
         
         # Compute loss (ignore padding)
         loss = self.criterion(outputs, targets)
@@ -311,6 +370,7 @@ class Trainer:
                 break
         
         logger.info("Training completed!")
+        self.wait_for_checkpoints()
         self.save_training_history()
     
     def save_checkpoint(
@@ -320,37 +380,65 @@ class Trainer:
         metrics: Dict,
         is_best: bool = False
     ):
-        """Save model checkpoint."""
+        """
+        Save model checkpoint.
+        
+        State is snapshotted to CPU here; writing to disk happens in the
+        background (see wait_for_checkpoints).
+        """
+        # Surface errors from earlier saves
+        self._collect_checkpoints(wait=False)
+        
+        # Save the underlying module's weights, without torch.compile's prefix
+        model = getattr(self.model, '_orig_mod', self.model)
+        
         checkpoint = {
             'epoch': epoch,
-            'model_state_dict': self.model.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
+            'model_state_dict': _to_cpu(model.state_dict()),
+            'optimizer_state_dict': _to_cpu(self.optimizer.state_dict()),
             'val_loss': val_loss,
             'metrics': metrics,
-            'history': self.history,
+            'history': copy.deepcopy(self.history),
             'vocabulary_size': len(self.vocabulary),
             'model_config': {
                 'vocab_size': self.model.vocab_size,
-                'embed_dim': self.model.embed_dim
+                'embed_dim': self.model.embed_dim,
+                'tie_weights': self.model.decoder.tie_weights
             }
         }
         
         if self.scheduler:
-            checkpoint['scheduler_state_dict'] = self.scheduler.state_dict()
+            checkpoint['scheduler_state_dict'] = _to_cpu(self.scheduler.state_dict())
         
         # Save regular checkpoint
         checkpoint_path = os.path.join(
             self.checkpoint_dir,
             f'checkpoint_epoch_{epoch}.pth'
         )
-        torch.save(checkpoint, checkpoint_path)
-        logger.info(f"Saved checkpoint: {checkpoint_path}")
+        paths = [checkpoint_path]
         
         # Save best model
         if is_best:
-            best_path = os.path.join(self.checkpoint_dir, 'best_model.pth')
-            torch.save(checkpoint, best_path)
-            logger.info(f"Saved best model: {best_path}")
+            paths.append(os.path.join(self.checkpoint_dir, 'best_model.pth'))
+        
+        for path in paths:
+            self._ckpt_futures.append(
+                self._ckpt_executor.submit(_atomic_save, checkpoint, path)
+            )
+    
+    def _collect_checkpoints(self, wait: bool):
+        """Drop finished checkpoint writes, re-raising any error."""
+        pending = []
+        for future in self._ckpt_futures:
+            if wait or future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self._ckpt_futures = pending
+    
+    def wait_for_checkpoints(self):
+        """Block until all queued checkpoint writes are on disk."""
+        self._collect_checkpoints(wait=True)
     
     def save_training_history(self):
         """Save training history to JSON."""
@@ -363,7 +451,15 @@ class Trainer:
     def load_checkpoint(checkpoint_path: str, model: nn.Module, optimizer: Optional[torch.optim.Optimizer] = None):
         """Load model from checkpoint."""
         checkpoint = torch.load(checkpoint_path, map_location='cpu')
-        model.load_state_dict(checkpoint['model_state_dict'])
+        
+        # Accept checkpoints from torch.compile'd models and load into the
+        # underlying module if `model` itself is compiled
+        prefix = '_orig_mod.'
+        state_dict = {
+            (k[len(prefix):] if k.startswith(prefix) else k): v
+            for k, v in checkpoint['model_state_dict'].items()
+        }
+        getattr(model, '_orig_mod', model).load_state_dict(state_dict)
         
         if optimizer and 'optimizer_state_dict' in checkpoint:
             optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
@@ -2,45 +2,120 @@
 Image transformations and augmentations.
 """
 
-import torchvision.transforms as transforms
+import torch
+import torch.nn as nn
+from torchvision.transforms import v2 as transforms
 
+# Optional: GPU augmentation for the training step (pip install kornia)
+try:
+    import kornia.augmentation as K
+    import kornia.enhance
+    KORNIA_AVAILABLE = True
+except ImportError:
+    KORNIA_AVAILABLE = False
 
-def get_transforms(mode: str = 'train', image_size: int = 224):
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def get_transforms(
+    mode: str = 'train',
+    image_size: int = 224,
+    pre_resized: bool = False,
+    device_normalize: bool = False
+):
     """
     Get image transformations for training or validation.
     
     Args:
         mode: 'train' or 'val'
         image_size: Target image size
+        pre_resized: Inputs are uint8 (3, H, W) tensors from the dataset's
+            image cache, already resized (image_size + 32 for 'train')
+        device_normalize: Stop at uint8 (3, H, W) tensors and leave scaling
+            and normalization to the model (CaptioningModel.gpu_preproc)
         
     Returns:
         transform: Composed transformations
     """
     # ImageNet normalization statistics
-    normalize = transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
+    normalize = transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    
+    # Everything runs on uint8 tensors; PIL inputs are converted up front
+    to_tensor = [] if pre_resized else [transforms.PILToTensor()]
+    
+    # Final conversion: stay uint8 for on-device normalization, else float + normalize
+    finish = [] if device_normalize else [transforms.ToDtype(torch.float32, scale=True), normalize]
     
     if mode == 'train':
-        transform = transforms.Compose([
-            transforms.Resize((image_size + 32, image_size + 32)),
+        resize = [] if pre_resized else [transforms.Resize((image_size + 32, image_size + 32))]
+        transform = transforms.Compose(to_tensor + resize + [
             transforms.RandomCrop(image_size),
             transforms.RandomHorizontalFlip(p=0.5),
-            transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2),
-            transforms.ToTensor(),
-            normalize
-        ])
+            transforms.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2)
+        ] + finish)
     else:  # val or test
-        transform = transforms.Compose([
-            transforms.Resize((image_size, image_size)),
-            transforms.ToTensor(),
-            normalize
-        ])
+        resize = [] if pre_resized else [transforms.Resize((image_size, image_size))]
+        steps = to_tensor + resize + finish
+        # Cached uint8 input with on-device normalization needs no work at all
+        transform = transforms.Compose(steps) if steps else transforms.Identity()
     
     return transform
 
 
+def get_transforms_minimal(image_size: int = 224):
+    """
+    CPU-side training transform for GPU augmentation: resize + uint8 tensor only.
+    
+    Cropping, flipping, jitter and normalization are done on the device by
+    GPUAugmentation.
+    
+    Args:
+        image_size: Target (post-crop) image size
+        
+    Returns:
+        transform: Composed transformations producing uint8 (3, H+32, W+32)
+    """
+    return transforms.Compose([
+        transforms.PILToTensor(),
+        transforms.Resize((image_size + 32, image_size + 32))
+    ])
+
+
+class GPUAugmentation(nn.Module):
+    """
+    Training augmentation run on the device with Kornia.
+    
+    Mirrors the CPU 'train' pipeline of get_transforms: random crop,
+    horizontal flip, color jitter and ImageNet normalization.
+    """
+    
+    def __init__(self, image_size: int = 224):
+        super(GPUAugmentation, self).__init__()
+        if not KORNIA_AVAILABLE:
+            raise ImportError("GPU augmentation requires kornia (pip install kornia)")
+        
+        self.augment = nn.Sequential(
+            K.RandomCrop((image_size, image_size)),
+            K.RandomHorizontalFlip(p=0.5),
+            K.ColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, p=1.0),
+            kornia.enhance.Normalize(
+                mean=torch.tensor(IMAGENET_MEAN),
+                std=torch.tensor(IMAGENET_STD)
+            )
+        )
+    
+    def forward(self, images: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            images: (batch_size, 3, H, W) uint8
+            
+        Returns:
+            images: (batch_size, 3, image_size, image_size) float, normalized
+        """
+        return self.augment(images.float().div_(255))
+
+
 def denormalize_image(tensor, mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]):
     """
     Denormalize image tensor for visualization.
@@ -53,8 +128,6 @@ def denormalize_image(tensor, mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.2
     Returns:
         denormalized: Denormalized tensor
     """
-    import torch
-    
     mean = torch.tensor(mean).view(3, 1, 1)
     std = torch.tensor(std).view(3, 1, 1)
     
@@ -3,10 +3,27 @@ Vocabulary builder for caption tokenization.
 """
 
 import json
+import string
+from bisect import bisect_right
 from collections import Counter
-from typing import List, Dict
+from functools import lru_cache
+from itertools import chain
+from typing import Iterable, List, Dict, Optional
 import pickle
 
+# Optional fast JSON (de)serializer
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# Punctuation deletion tables (built once, used per caption); bytes.translate
+# is much faster than str.translate, so ASCII text takes the bytes path
+_PUNCT_TRANS = str.maketrans('', '', string.punctuation)
+_PUNCT_BYTES = string.punctuation.encode('ascii')
+
 
 class Vocabulary:
     """Build and manage vocabulary for captions."""
@@ -24,9 +41,9 @@ class Vocabulary:
         """
         self.freq_threshold = freq_threshold
         
-        # Token to index mapping
+        # Token to index mapping; indices are dense, so the inverse is a list
         self.word2idx = {}
-        self.idx2word = {}
+        self.idx2word = []
         
         # Special token indices
         self.pad_idx = 0
@@ -37,6 +54,23 @@ class Vocabulary:
         # Initialize with special tokens
         self._init_special_tokens()
         
+        # Per-instance memo of encode() results (rebuilt after unpickling)
+        self._init_encode_cache()
+    
+    def _init_encode_cache(self):
+        """Create the LRU cache used by encode()."""
+        self._encode_cached = lru_cache(maxsize=4096)(self._encode)
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_encode_cached', None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_encode_cache()
+        self._build_skip_mask()
+        
     def _init_special_tokens(self):
         """Initialize special tokens."""
         self.word2idx = {
@@ -45,28 +79,64 @@ class Vocabulary:
             self.END_TOKEN: self.end_idx,
             self.UNK_TOKEN: self.unk_idx
         }
-        self.idx2word = {idx: word for word, idx in self.word2idx.items()}
+        self.idx2word = [self.PAD_TOKEN, self.START_TOKEN, self.END_TOKEN, self.UNK_TOKEN]
+        self._build_skip_mask()
+    
+    def _build_skip_mask(self):
+        """Per-index flags for tokens decode() drops with skip_special_tokens."""
+        self._skip_mask = bytearray(len(self.idx2word))
+        self._skip_mask[self.pad_idx] = 1
+        self._skip_mask[self.start_idx] = 1
     
-    def build_vocabulary(self, captions: List[str]):
+    def build_vocabulary(self, captions: Iterable[str], max_vocab_size: Optional[int] = None):
         """
-        Build vocabulary from list of captions.
+        Build vocabulary from captions.
+        
+        Words are added most frequent first. captions is consumed once, so
+        a generator (e.g. a streaming JSON parse) works.
         
         Args:
-            captions: List of caption strings
-        """
-        # Count word frequencies
-        word_counts = Counter()
-        for caption in captions:
-            tokens = self.tokenize(caption)
-            word_counts.update(tokens)
-        
-        # Add words above threshold
-        idx = len(self.word2idx)
-        for word, count in word_counts.items():
-            if count >= self.freq_threshold and word not in self.word2idx:
-                self.word2idx[word] = idx
-                self.idx2word[idx] = word
-                idx += 1
+            captions: Iterable of caption strings
+            max_vocab_size: Keep at most this many words (special tokens excluded)
+        """
+        self.build_from_counts(self.count_words(captions), max_vocab_size)
+    
+    @classmethod
+    def count_words(cls, captions: Iterable[str]) -> Counter:
+        """
+        Count token frequencies over captions.
+        
+        Args:
+            captions: Iterable of caption strings
+            
+        Returns:
+            word_counts: Counter of token -> frequency
+        """
+        return Counter(chain.from_iterable(map(cls.tokenize, captions)))
+    
+    def build_from_counts(self, word_counts: Counter, max_vocab_size: Optional[int] = None):
+        """
+        Build vocabulary from precomputed word counts (e.g. merged from
+        several processes).
+        
+        Args:
+            word_counts: Counter of token -> frequency
+            max_vocab_size: Keep at most this many words (special tokens excluded)
+        """
+        # Sorted by descending count, so words above threshold form a prefix
+        items = word_counts.most_common()
+        cutoff = bisect_right([-count for _, count in items], -self.freq_threshold)
+        if max_vocab_size is not None:
+            cutoff = min(cutoff, max_vocab_size)
+        
+        new_words = [word for word, _ in items[:cutoff] if word not in self.word2idx]
+        base = len(self.word2idx)
+        self.word2idx.update({word: base + i for i, word in enumerate(new_words)})
+        self.idx2word.extend(new_words)
+        self._build_skip_mask()
+        
+        # Cached encodings may predate the new words
+        self._encode_cached.cache_clear()
         
         print(f"Vocabulary built: {len(self.word2idx)} tokens")
         print(f"Words filtered (freq < {self.freq_threshold}): {len(word_counts) - len(self.word2idx) + 4}")
@@ -82,16 +152,11 @@ class Vocabulary:
         Returns:
             tokens: List of tokens
         """
-        # Lowercase and split
-        text = text.lower().strip()
-        
-        # Remove punctuation and split
-        import string
-        translator = str.maketrans('', '', string.punctuation)
-        text = text.translate(translator)
-        
-        tokens = text.split()
-        return tokens
+        # Lowercase, remove punctuation and split on whitespace
+        text = text.lower()
+        if text.isascii():
+            return text.encode('ascii').translate(None, _PUNCT_BYTES).decode('ascii').split()
+        return text.translate(_PUNCT_TRANS).split()
     
     def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
         """
@@ -104,6 +169,11 @@ class Vocabulary:
         Returns:
             indices: List of token indices
         """
+        # Repeated texts are served from the cache; copy so callers may mutate
+        return list(self._encode_cached(text, add_special_tokens))
+    
+    def _encode(self, text: str, add_special_tokens: bool) -> tuple:
+        """Uncached encode(); returns an immutable tuple for the cache."""
         tokens = self.tokenize(text)
         
         # Convert to indices
@@ -113,7 +183,29 @@ class Vocabulary:
         if add_special_tokens:
             indices = [self.start_idx] + indices + [self.end_idx]
         
-        return indices
+        return tuple(indices)
+    
+    def batch_encode(self, texts: List[str], add_special_tokens: bool = True) -> List[List[int]]:
+        """
+        Convert many texts to token indices (same result as encode() per text).
+        
+        Args:
+            texts: Input texts
+            add_special_tokens: Add <start> and <end> tokens
+            
+        Returns:
+            indices: One list of token indices per text
+        """
+        # Bind lookups once for the whole batch
+        tokenize = self.tokenize
+        get = self.word2idx.get
+        unk = self.unk_idx
+        
+        if not add_special_tokens:
+            return [[get(token, unk) for token in tokenize(text)] for text in texts]
+        
+        start, end = self.start_idx, self.end_idx
+        return [[start, *[get(token, unk) for token in tokenize(text)], end] for text in texts]
     
     def decode(self, indices: List[int], skip_special_tokens: bool = True) -> str:
         """
@@ -126,18 +218,26 @@ class Vocabulary:
         Returns:
             text: Decoded text
         """
-        special_indices = {self.pad_idx, self.start_idx, self.end_idx}
+        # Bind lookups locally for the per-token loop
+        idx2word = self.idx2word
+        skip_mask = self._skip_mask
+        vocab_size = len(idx2word)
+        end_idx = self.end_idx
+        unk_token = self.UNK_TOKEN
         
         tokens = []
+        tokens_append = tokens.append
         for idx in indices:
-            if skip_special_tokens and idx in special_indices:
-                continue
-            
             # Stop at end token
-            if idx == self.end_idx:
+            if idx == end_idx:
                 break
-                
-            tokens.append(self.idx2word.get(idx, self.UNK_TOKEN))
+            
+            if 0 <= idx < vocab_size:
+                if skip_special_tokens and skip_mask[idx]:
+                    continue
+                tokens_append(idx2word[idx])
+            else:
+                tokens_append(unk_token)
         
         return ' '.join(tokens)
     
@@ -146,19 +246,28 @@ class Vocabulary:
         return len(self.word2idx)
     
     def save(self, filepath: str):
-        """Save vocabulary to file."""
+        """
+        Save vocabulary to file.
+        
+        '.json' files are written with orjson when available (json otherwise);
+        any other suffix is pickled. idx2word is not stored since load()
+        rebuilds it from word2idx.
+        """
         vocab_dict = {
             'word2idx': self.word2idx,
-            'idx2word': self.idx2word,
             'freq_threshold': self.freq_threshold
         }
         
         if filepath.endswith('.json'):
-            with open(filepath, 'w') as f:
-                json.dump(vocab_dict, f, indent=2)
+            if ORJSON_AVAILABLE:
+                with open(filepath, 'wb') as f:
+                    f.write(orjson.dumps(vocab_dict))
+            else:
+                with open(filepath, 'w') as f:
+                    json.dump(vocab_dict, f)
         else:
             with open(filepath, 'wb') as f:
-                pickle.dump(vocab_dict, f)
+                pickle.dump(vocab_dict, f, protocol=pickle.HIGHEST_PROTOCOL)
         
         print(f"Vocabulary saved to {filepath}")
     
@@ -166,8 +275,9 @@ class Vocabulary:
     def load(cls, filepath: str) -> 'Vocabulary':
         """Load vocabulary from file."""
         if filepath.endswith('.json'):
-            with open(filepath, 'r') as f:
-                vocab_dict = json.load(f)
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            vocab_dict = orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
         else:
             with open(filepath, 'rb') as f:
                 vocab_dict = pickle.load(f)
@@ -176,11 +286,11 @@ class Vocabulary:
         vocab = cls(freq_threshold=vocab_dict['freq_threshold'])
         vocab.word2idx = vocab_dict['word2idx']
         
-        # Convert string keys to int for idx2word
-        if filepath.endswith('.json'):
-            vocab.idx2word = {int(k): v for k, v in vocab_dict['idx2word'].items()}
-        else:
-            vocab.idx2word = vocab_dict['idx2word']
+        # Rebuild the inverse mapping (older files also stored it; ignored)
+        vocab.idx2word = [None] * len(vocab.word2idx)
+        for word, idx in vocab.word2idx.items():
+            vocab.idx2word[idx] = word
+        vocab._build_skip_mask()
         
         print(f"Vocabulary loaded from {filepath}: {len(vocab)} tokens")
         return vocab
@@ -0,0 +1,42 @@
+"""
+Atomic file writes for the setup scripts.
+
+A write interrupted halfway (e.g. Ctrl+C) leaves the previous file, or no
+file, instead of a truncated .env.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def write_atomic(path, data):
+    """
+    Write data to path via a temporary file in the same directory.
+
+    The new file keeps the old file's permissions, or gets the usual
+    umask-based ones when it is created (mkstemp alone would make it 0600).
+
+    Args:
+        path: Destination file
+        data: Text to write (UTF-8 encoded)
+    """
+    path = Path(path)
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,104 @@
+"""
+Docker availability probes shared by the setup scripts.
+
+Results are cached on disk for a few minutes so repeated script runs in the
+same session don't spawn the docker CLI again.
+"""
+
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+CACHE_FILE = Path.home() / '.cache' / 'mydailywork' / 'docker.json'
+CACHE_TTL = 300  # seconds
+
+PROBES = {
+    'docker': ['docker', '--version'],
+    'compose_plugin': ['docker', 'compose', 'version'],
+    'compose_legacy': ['docker-compose', '--version'],
+    'daemon': ['docker', 'ps'],
+}
+
+
+@dataclass
+class DockerEnv:
+    """Result of probing the local Docker installation."""
+    docker_version: Optional[str]
+    compose_version: Optional[str]
+    compose_plugin: bool
+    daemon_up: bool
+
+    @property
+    def ready(self):
+        return bool(self.docker_version and self.compose_version and self.daemon_up)
+
+
+def _run(cmd):
+    """Return the stripped stdout of cmd, or None if it fails."""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+
+def _probe():
+    """Run all docker probes concurrently."""
+    with ThreadPoolExecutor(max_workers=len(PROBES)) as pool:
+        futures = {name: pool.submit(_run, cmd) for name, cmd in PROBES.items()}
+    out = {name: future.result() for name, future in futures.items()}
+
+    return DockerEnv(
+        docker_version=out['docker'],
+        compose_version=out['compose_plugin'] or out['compose_legacy'],
+        compose_plugin=out['compose_plugin'] is not None,
+        daemon_up=out['daemon'] is not None,
+    )
+
+
+def _read_cache():
+    try:
+        if time.time() - CACHE_FILE.stat().st_mtime >= CACHE_TTL:
+            return None
+        return DockerEnv(**json.loads(CACHE_FILE.read_text()))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _write_cache(env):
+    try:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_FILE.with_suffix('.tmp')
+        tmp.write_text(json.dumps(asdict(env)))
+        os.replace(tmp, CACHE_FILE)
+    except OSError:
+        pass
+
+
+def docker_env(refresh=False):
+    """
+    Probe Docker, reusing a result cached less than CACHE_TTL seconds ago.
+
+    Only a fully working setup is cached, so after installing Docker or
+    starting the daemon the next call probes again.
+
+    Args:
+        refresh: Ignore the cache and probe again
+
+    Returns:
+        DockerEnv
+    """
+    if not refresh:
+        cached = _read_cache()
+        if cached is not None:
+            return cached
+
+    env = _probe()
+    if env.ready:
+        _write_cache(env)
+    return env
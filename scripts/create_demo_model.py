@@ -7,12 +7,35 @@ import json
 import sys
 from pathlib import Path
 
+# Optional fast JSON serializer
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 project_root = Path(__file__).parent.parent
 backend_dir = project_root / "backend"
 sys.path.insert(0, str(backend_dir))
 
-def create_demo_model():
-    """Create demo model checkpoint and vocabulary."""
+def write_json(path: Path, obj, pretty: bool = False):
+    """Write obj as JSON (compact unless pretty), using orjson when available."""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_INDENT_2 if pretty else None
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=option))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2 if pretty else None)
+
+
+def create_demo_model(pretty: bool = False):
+    """
+    Create demo model checkpoint and vocabulary.
+    
+    Args:
+        pretty: Indent the JSON artifacts (they are compact by default)
+    """
     
     checkpoints_dir = backend_dir / "checkpoints"
     checkpoints_dir.mkdir(exist_ok=True)
@@ -40,8 +63,7 @@ def create_demo_model():
     
     # Save vocabulary
     vocab_path = checkpoints_dir / "demo_vocab.json"
-    with open(vocab_path, 'w') as f:
-        json.dump(vocab, f, indent=2)
+    write_json(vocab_path, vocab, pretty)
     print(f"✅ Vocabulary saved: {vocab_path}")
     print(f"   Vocabulary size: {len(vocab)} words")
     
@@ -59,8 +81,7 @@ def create_demo_model():
     }
     
     config_path = checkpoints_dir / "model_config.json"
-    with open(config_path, 'w') as f:
-        json.dump(model_config, f, indent=2)
+    write_json(config_path, model_config, pretty)
     print(f"✅ Model config saved: {config_path}")
     
     # Create a dummy model file (just metadata for demo)
@@ -82,8 +103,7 @@ def create_demo_model():
     except ImportError:
         # If torch not available, create a simple JSON file
         model_path = checkpoints_dir / "demo_model.json"
-        with open(model_path, 'w') as f:
-            json.dump(model_config, f, indent=2)
+        write_json(model_path, model_config, pretty)
         print(f"✅ Demo model config saved: {model_path}")
         print("   (PyTorch not installed - using demo predictor)")
     
@@ -94,8 +114,14 @@ def create_demo_model():
     return vocab_path, model_path
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Create demo model and vocabulary')
+    parser.add_argument('--pretty', action='store_true', help='Write indented JSON')
+    args = parser.parse_args()
+    
     try:
-        create_demo_model()
+        create_demo_model(pretty=args.pretty)
     except Exception as e:
         print(f"\n❌ Error creating demo model: {e}")
         import traceback
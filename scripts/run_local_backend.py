@@ -27,8 +27,7 @@ def main():
     
     if not env_file.exists() and env_local.exists():
         print("📋 Copying .env.local to .env...")
-        import shutil
-        shutil.copy(env_local, env_file)
+        env_file.write_bytes(env_local.read_bytes())
         print("✅ Environment file created\n")
     
     # Initialize database
@@ -52,7 +51,7 @@ def main():
     if not demo_model.exists() or not demo_vocab.exists():
         print("🤖 Creating demo model...")
         try:
-            sys.path.insert(0, str(project_root / "scripts"))
+            # scripts/ is already sys.path[0] (this file's directory)
             from create_demo_model import create_demo_model
             create_demo_model()
             print("✅ Demo model created\n")
@@ -7,7 +7,6 @@ Simple HTTP server for the HTML/JS frontend.
 import os
 import sys
 import http.server
-import socketserver
 import webbrowser
 from pathlib import Path
 import time
@@ -28,6 +27,21 @@ class CORSHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200)
         self.end_headers()
+    
+    def copyfile(self, source, outputfile):
+        """Send file bodies with sendfile() when the source is a real file."""
+        try:
+            source.fileno()
+        except (AttributeError, OSError):
+            return super().copyfile(source, outputfile)
+        outputfile.flush()
+        self.connection.sendfile(source)
+
+class FrontendServer(http.server.ThreadingHTTPServer):
+    """Threaded server so slow clients don't block other requests."""
+    
+    daemon_threads = True
+    allow_reuse_address = True
 
 def open_browser():
     """Open browser after a short delay."""
@@ -59,7 +73,7 @@ def main():
     
     # Start server
     try:
-        with socketserver.TCPServer(("", PORT), CORSHTTPRequestHandler) as httpd:
+        with FrontendServer(("", PORT), CORSHTTPRequestHandler) as httpd:
             print(f"✅ Serving at http://localhost:{PORT}\n")
             httpd.serve_forever()
     except KeyboardInterrupt:
@@ -4,20 +4,137 @@ Automates deployment to Render + Vercel + Supabase.
 """
 
 import os
-import sys
+import json
+import time
+import argparse
 import subprocess
+import textwrap
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import questionary
-from rich.console import Console
-from rich.panel import Panel
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
-console = Console()
+BOX_WIDTH = 64
+
+
+def _box(body, title=None):
+    """Print body between horizontal rules, wrapping long lines."""
+    rule = "─" * BOX_WIDTH
+    print(f"\n{rule}")
+    if title:
+        print(f"  {title}\n{rule}")
+    for line in body.strip("\n").splitlines():
+        indent = line[:len(line) - len(line.lstrip())]
+        print(textwrap.fill(line, BOX_WIDTH, subsequent_indent=indent + "   ") if line else "")
+    print(rule)
+
+
+def _prompt(message, validate=None):
+    """Ask until the answer passes validate (if given)."""
+    while True:
+        answer = input(f"{message} ").strip()
+        if validate is None or validate(answer):
+            return answer
+        print("  Invalid value, please try again.")
+
+
+def _confirm(message, default=True):
+    """Ask a yes/no question; Enter picks the default."""
+    answer = input(f"{message} ({'Y/n' if default else 'y/N'}) ").strip().lower()
+    return answer.startswith('y') if answer else default
+
+
+# Answers from previous runs (db_url, backend_url, frontend_url)
+STATE_FILE = Path.home() / '.cache' / 'mydailywork' / 'free_tier.json'
+
+
+def _load_state():
+    """Load answers saved by a previous run."""
+    try:
+        return json.loads(STATE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state):
+    """Save answers atomically; readable by the owner only (db_url has a password)."""
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_FILE.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state, indent=2))
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, STATE_FILE)
+
+
+def remembered(state, key, label, step, *args):
+    """Return state[key] if a previous run saved it, else run step and save its result."""
+    if state.get(key):
+        print(f"\n✅ Using saved {label} (run with --force to re-enter)")
+        return state[key]
+    
+    value = step(*args)
+    if value:
+        state[key] = value
+        _save_state(state)
+    return value
+
+
+def backend_healthy(backend_url):
+    """Return True if the backend's /health endpoint answers 200."""
+    try:
+        with urllib.request.urlopen(f"{backend_url.rstrip('/')}/health", timeout=10) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+def cors_allows(backend_url, origin):
+    """Return True if a CORS preflight from origin is accepted by the backend."""
+    request = urllib.request.Request(
+        f"{backend_url.rstrip('/')}/health",
+        method='OPTIONS',
+        headers={'Origin': origin, 'Access-Control-Request-Method': 'GET'}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.headers.get('Access-Control-Allow-Origin') in (origin, '*')
+    except Exception:
+        return False
+
+
+def wait_until(check, description, done, prompt, timeout=900, interval=5):
+    """
+    Poll check() until it returns True instead of waiting for the user.
+    
+    Falls back to an Enter prompt on timeout or Ctrl+C.
+    """
+    deadline = time.monotonic() + timeout
+    ready = False
+    print(f"\n⏳ {description}... (Ctrl+C to continue manually)")
+    try:
+        while not ready and time.monotonic() < deadline:
+            ready = check()
+            if not ready:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    
+    if ready:
+        print(f"✅ {done}")
+    else:
+        input(f"\n{prompt}")
+
+
+def tool_available(cmd):
+    """Return True if the version command runs successfully."""
+    try:
+        subprocess.run(cmd.split(), capture_output=True, check=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
 
 
 def check_prerequisites():
     """Check if required tools are installed."""
-    console.print("\n[bold cyan]Checking prerequisites...[/bold cyan]")
+    print("\nChecking prerequisites...")
     
     required = {
         'git': 'git --version',
@@ -30,37 +147,41 @@ def check_prerequisites():
         'render': 'render --version'
     }
     
+    # Probe every tool at once; print in the original order below
+    commands = {**required, **optional}
+    with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+        futures = {tool: pool.submit(tool_available, cmd) for tool, cmd in commands.items()}
+    found = {tool: future.result() for tool, future in futures.items()}
+    
     missing = []
     
-    for tool, cmd in required.items():
-        try:
-            subprocess.run(cmd.split(), capture_output=True, check=True)
-            console.print(f"✅ {tool} found")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            console.print(f"❌ {tool} not found")
+    for tool in required:
+        if found[tool]:
+            print(f"✅ {tool} found")
+        else:
+            print(f"❌ {tool} not found")
             missing.append(tool)
     
     if missing:
-        console.print(f"\n[bold red]Missing required tools: {', '.join(missing)}[/bold red]")
+        print(f"\nMissing required tools: {', '.join(missing)}")
         return False
     
     # Check optional
-    for tool, cmd in optional.items():
-        try:
-            subprocess.run(cmd.split(), capture_output=True, check=True)
-            console.print(f"✅ {tool} CLI found")
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            console.print(f"⚠️  {tool} CLI not found (will use manual deployment)")
+    for tool in optional:
+        if found[tool]:
+            print(f"✅ {tool} CLI found")
+        else:
+            print(f"⚠️  {tool} CLI not found (will use manual deployment)")
     
     return True
 
 
 def setup_supabase():
     """Guide user through Supabase setup."""
-    console.print("\n[bold cyan]Setting up Supabase Database[/bold cyan]")
+    print("\nSetting up Supabase Database")
     
-    console.print(Panel.fit(
-        "[bold]Supabase Setup Instructions[/bold]\n\n"
+    _box(
+        "Supabase Setup Instructions\n\n"
         "1. Visit https://supabase.com and sign up\n"
         "2. Create new project: 'image-captioning'\n"
         "3. Choose free tier (500MB)\n"
@@ -69,22 +190,22 @@ def setup_supabase():
         "6. Copy connection string\n"
         "7. Run the SQL schema (backend/database/schema.sql)",
         title="📊 Database Setup"
-    ))
+    )
     
-    connection_string = questionary.text(
+    connection_string = _prompt(
         "Paste your Supabase connection string:",
         validate=lambda x: "postgresql://" in x
-    ).ask()
+    )
     
     return connection_string
 
 
 def deploy_backend_render():
     """Guide through Render deployment."""
-    console.print("\n[bold cyan]Deploying Backend to Render[/bold cyan]")
+    print("\nDeploying Backend to Render")
     
-    console.print(Panel.fit(
-        "[bold]Render Deployment Instructions[/bold]\n\n"
+    _box(
+        "Render Deployment Instructions\n\n"
         "1. Visit https://dashboard.render.com\n"
         "2. Create New > Web Service\n"
         "3. Connect your GitHub repository\n"
@@ -95,36 +216,40 @@ def deploy_backend_render():
         "5. Add environment variables (see below)\n"
         "6. Click 'Create Web Service'",
         title="🚀 Backend Deployment"
-    ))
-    
-    console.print("\n[bold]Required Environment Variables:[/bold]")
-    console.print("DATABASE_URL: <your-supabase-connection-string>")
-    console.print("SECRET_KEY: <generate-random-string>")
-    console.print("DEVICE: cpu")
-    console.print("ALLOWED_ORIGINS: https://your-app.vercel.app")
+    )
     
-    input("\nPress Enter once deployment is complete...")
+    print("\nRequired Environment Variables:")
+    print("DATABASE_URL: <your-supabase-connection-string>")
+    print("SECRET_KEY: <generate-random-string>")
+    print("DEVICE: cpu")
+    print("ALLOWED_ORIGINS: https://your-app.vercel.app")
     
-    backend_url = questionary.text(
+    backend_url = _prompt(
         "Enter your Render backend URL (e.g., https://your-app.onrender.com):"
-    ).ask()
+    )
+    
+    if backend_url:
+        wait_until(lambda: backend_healthy(backend_url),
+                   "Waiting for the backend to report healthy",
+                   "Backend is healthy",
+                   "Press Enter once deployment is complete...")
     
     return backend_url
 
 
 def deploy_frontend_vercel(backend_url):
     """Deploy frontend to Vercel."""
-    console.print("\n[bold cyan]Deploying Frontend to Vercel[/bold cyan]")
+    print("\nDeploying Frontend to Vercel")
     
     # Check if vercel CLI is available
     try:
         subprocess.run(['vercel', '--version'], capture_output=True, check=True)
-        use_cli = questionary.confirm("Use Vercel CLI for deployment?").ask()
+        use_cli = _confirm("Use Vercel CLI for deployment?")
     except (subprocess.CalledProcessError, FileNotFoundError):
         use_cli = False
     
     if use_cli:
-        console.print("\nDeploying with Vercel CLI...")
+        print("\nDeploying with Vercel CLI...")
         os.chdir('frontend')
         
         # Login
@@ -140,18 +265,18 @@ def deploy_frontend_vercel(backend_url):
         result = subprocess.run(['vercel', '--prod'], capture_output=True, text=True)
         
         if result.returncode == 0:
-            console.print("\n✅ Frontend deployed successfully!")
+            print("\n✅ Frontend deployed successfully!")
             # Extract URL from output
             for line in result.stdout.split('\n'):
                 if 'https://' in line:
                     frontend_url = line.strip()
                     break
         else:
-            console.print(f"\n❌ Deployment failed: {result.stderr}")
+            print(f"\n❌ Deployment failed: {result.stderr}")
             return None
     else:
-        console.print(Panel.fit(
-            "[bold]Manual Vercel Deployment[/bold]\n\n"
+        _box(
+            "Manual Vercel Deployment\n\n"
             "1. Visit https://vercel.com\n"
             "2. Import your GitHub repository\n"
             "3. Set Root Directory to: frontend\n"
@@ -159,23 +284,26 @@ def deploy_frontend_vercel(backend_url):
             f"   NEXT_PUBLIC_API_URL={backend_url}\n"
             "5. Click 'Deploy'",
             title="🎨 Frontend Deployment"
-        ))
+        )
         
-        frontend_url = questionary.text(
+        frontend_url = _prompt(
             "Enter your Vercel frontend URL (e.g., https://your-app.vercel.app):"
-        ).ask()
+        )
     
     return frontend_url
 
 
 def update_cors(backend_url, frontend_url):
     """Update CORS settings."""
-    console.print("\n[bold cyan]Updating CORS Settings[/bold cyan]")
+    print("\nUpdating CORS Settings")
     
-    console.print(f"\nUpdate ALLOWED_ORIGINS in Render:")
-    console.print(f"  ALLOWED_ORIGINS={frontend_url}")
+    print(f"\nUpdate ALLOWED_ORIGINS in Render:")
+    print(f"  ALLOWED_ORIGINS={frontend_url}")
     
-    input("\nPress Enter once updated...")
+    wait_until(lambda: cors_allows(backend_url, frontend_url),
+               "Waiting for the backend to accept the frontend origin",
+               "CORS updated",
+               "Press Enter once updated...")
 
 
 def create_summary(db_url, backend_url, frontend_url):
@@ -233,42 +361,50 @@ def create_summary(db_url, backend_url, frontend_url):
     with open('DEPLOYMENT_INFO.txt', 'w') as f:
         f.write(summary)
     
-    console.print(Panel.fit(summary, title="🎉 Deployment Complete!"))
-    console.print("\n✅ Summary saved to DEPLOYMENT_INFO.txt")
+    _box(summary, title="🎉 Deployment Complete!")
+    print("\n✅ Summary saved to DEPLOYMENT_INFO.txt")
 
 
 def main():
     """Main deployment orchestrator."""
-    console.print(Panel.fit(
-        "[bold cyan]Free Tier Deployment Setup[/bold cyan]\n\n"
+    parser = argparse.ArgumentParser(description='Free tier deployment setup')
+    parser.add_argument('--force', action='store_true',
+                        help='Ignore answers saved by a previous run')
+    args = parser.parse_args()
+    
+    _box(
+        "Free Tier Deployment Setup\n\n"
         "This script will guide you through deploying to:\n"
         "• Supabase (Database - Free 500MB)\n"
         "• Render (Backend - Free 750hrs/month)\n"
         "• Vercel (Frontend - Free unlimited)\n\n"
-        "[bold green]Total Cost: $0/month[/bold green]",
+        "Total Cost: $0/month",
         title="🚀 Image Captioning Deployment"
-    ))
+    )
+    
+    state = {} if args.force else _load_state()
     
-    if not questionary.confirm("\nReady to begin?").ask():
-        console.print("Deployment cancelled.")
+    if not _confirm("\nReady to begin?"):
+        print("Deployment cancelled.")
         return
     
     # Check prerequisites
     if not check_prerequisites():
-        console.print("\nPlease install missing tools and try again.")
+        print("\nPlease install missing tools and try again.")
         return
     
     # Step 1: Supabase
-    db_url = setup_supabase()
+    db_url = remembered(state, 'db_url', "Supabase connection string", setup_supabase)
     
     # Step 2: Render
-    backend_url = deploy_backend_render()
+    backend_url = remembered(state, 'backend_url', "Render backend URL", deploy_backend_render)
     
     # Step 3: Vercel
-    frontend_url = deploy_frontend_vercel(backend_url)
+    frontend_url = remembered(state, 'frontend_url', "Vercel frontend URL",
+                              deploy_frontend_vercel, backend_url)
     
     if not frontend_url:
-        console.print("\n❌ Deployment incomplete. Please complete manually.")
+        print("\n❌ Deployment incomplete. Please complete manually.")
         return
     
     # Step 4: Update CORS
@@ -279,14 +415,4 @@ def main():
 
 
 if __name__ == '__main__':
-    # Check if required packages are installed
-    try:
-        import questionary
-        from rich.console import Console
-    except ImportError:
-        print("Installing required packages...")
-        subprocess.run([sys.executable, '-m', 'pip', 'install', 'questionary', 'rich'])
-        print("\nPlease run the script again.")
-        sys.exit(0)
-    
     main()
@@ -2,43 +2,76 @@
 Test script to verify optimization improvements.
 Run this locally before deploying to Vercel.
 """
+import asyncio
 import time
 import os
 import sys
 from pathlib import Path
 
+# Size the OpenMP/MKL pools before torch (or numpy) loads them: half the
+# cores for intra-op work leaves room for PIL preprocessing on the same box
+NUM_THREADS = max(1, (os.cpu_count() or 2) // 2)
+os.environ.setdefault("OMP_NUM_THREADS", str(NUM_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(NUM_THREADS))
+
+import torch
+
+# One torch runtime setup shared by both predictors
+torch.set_grad_enabled(False)
+torch.set_num_threads(NUM_THREADS)
+torch.set_num_interop_threads(1)
+torch.backends.cudnn.benchmark = True
+
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent / "backend"))
 
-def test_optimized_predictor():
-    """Test the optimized predictor performance."""
-    print("=" * 60)
-    print("Testing Optimized Predictor")
-    print("=" * 60)
+TEST_IMAGE = "test_images/beach.jpg"
+
+
+def ensure_test_image():
+    """Create a dummy test image if the sample one is missing."""
+    if not os.path.exists(TEST_IMAGE):
+        print(f"   ⚠ Test image not found: {TEST_IMAGE}")
+        print("   Creating dummy test image...")
+        from PIL import Image
+        os.makedirs("test_images", exist_ok=True)
+        img = Image.new('RGB', (800, 600), color='blue')
+        img.save(TEST_IMAGE)
+
+
+def load_optimized_predictor():
+    """
+    Create the optimized predictor and run one warm-up prediction.
     
+    The model is loaded lazily on the first predict, so the warm-up is
+    what actually loads the weights; it also keeps one-time setup (cuDNN
+    autotuning, allocator growth) out of the timed runs below.
+    
+    Returns:
+        (predictor, cold start seconds)
+    """
     from inference.optimized_predictor import get_optimized_predictor
     
-    # Test model loading time
-    print("\n1. Testing Model Loading (Cold Start)...")
+    print("\nTesting Model Loading (Cold Start)...")
     start = time.time()
     predictor = get_optimized_predictor()
+    predictor.predict(TEST_IMAGE, method="greedy", max_length=5)
     load_time = time.time() - start
-    print(f"   ✓ Model initialization: {load_time:.2f}s")
+    print(f"   ✓ Model load + warm-up: {load_time:.2f}s")
     
-    # Test image preprocessing
-    print("\n2. Testing Image Preprocessing...")
-    test_image = "test_images/beach.jpg"
+    return predictor, load_time
+
+
+def test_optimized_predictor(predictor, load_time):
+    """Test the optimized predictor performance."""
+    print("=" * 60)
+    print("Testing Optimized Predictor")
+    print("=" * 60)
     
-    if not os.path.exists(test_image):
-        print(f"   ⚠ Test image not found: {test_image}")
-        print("   Creating dummy test image...")
-        from PIL import Image
-        os.makedirs("test_images", exist_ok=True)
-        img = Image.new('RGB', (800, 600), color='blue')
-        img.save(test_image)
+    test_image = TEST_IMAGE
     
     # Test inference - Fast mode
-    print("\n3. Testing Inference - Fast Mode (beam_width=3)...")
+    print("\n1. Testing Inference - Fast Mode (beam_width=3)...")
     start = time.time()
     result = predictor.predict(test_image, method="beam_search", beam_width=3, max_length=30)
     inference_time = time.time() - start
@@ -47,7 +80,7 @@ def test_optimized_predictor():
     print(f"   ✓ Reported time: {result['inference_time_ms']:.2f}ms")
     
     # Test inference - Greedy mode
-    print("\n4. Testing Inference - Greedy Mode (fastest)...")
+    print("\n2. Testing Inference - Greedy Mode (fastest)...")
     start = time.time()
     result = predictor.predict(test_image, method="greedy", max_length=30)
     greedy_time = time.time() - start
@@ -55,11 +88,12 @@ def test_optimized_predictor():
     print(f"   ✓ Caption: {result['caption']}")
     
     # Test caching
-    print("\n5. Testing Image Cache...")
+    print("\n3. Testing Image Cache...")
     start = time.time()
     result = predictor.predict(test_image, method="greedy", max_length=30)
     cached_time = time.time() - start
     print(f"   ✓ Cached inference time: {cached_time*1000:.2f}ms")
+    print(f"   ✓ Served from result cache: {result.get('from_cache', False)}")
     speedup = (greedy_time / cached_time - 1) * 100 if cached_time > 0 else 0
     print(f"   ✓ Cache speedup: {speedup:.1f}%")
     
@@ -94,6 +128,15 @@ def test_optimized_predictor():
         print("   Model will be cached for subsequent requests.")
 
 
+async def _get_all(app, paths):
+    """GET paths from the ASGI app concurrently, without a server or TestClient."""
+    import httpx
+    
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.get(path) for path in paths))
+
+
 def test_api_optimization():
     """Test the optimized API features."""
     print("\n" + "=" * 60)
@@ -102,33 +145,30 @@ def test_api_optimization():
     
     try:
         from api.optimized_main import app
-        from fastapi.testclient import TestClient
         
-        client = TestClient(app)
+        health, root, info = asyncio.run(_get_all(app, ["/health", "/", "/api/info"]))
         
         # Test health endpoint
         print("\n1. Testing Health Endpoint...")
-        response = client.get("/health")
-        print(f"   ✓ Status: {response.status_code}")
-        print(f"   ✓ Response: {response.json()}")
+        print(f"   ✓ Status: {health.status_code}")
+        print(f"   ✓ Response: {health.json()}")
         
         # Test root endpoint (cached)
         print("\n2. Testing Root Endpoint (should have Cache-Control)...")
-        response = client.get("/")
-        print(f"   ✓ Status: {response.status_code}")
-        if "Cache-Control" in response.headers:
-            print(f"   ✓ Cache-Control: {response.headers['Cache-Control']}")
+        print(f"   ✓ Status: {root.status_code}")
+        cache_control = root.headers.get("Cache-Control")
+        if cache_control is not None:
+            print(f"   ✓ Cache-Control: {cache_control}")
         else:
             print("   ⚠ No Cache-Control header")
         
         # Test API info endpoint
         print("\n3. Testing API Info Endpoint...")
-        response = client.get("/api/info")
-        print(f"   ✓ Status: {response.status_code}")
-        if response.status_code == 200:
-            info = response.json()
-            print(f"   ✓ Version: {info.get('version')}")
-            print(f"   ✓ Features: {len(info.get('features', []))} features")
+        print(f"   ✓ Status: {info.status_code}")
+        if info.status_code == 200:
+            data = info.json()
+            print(f"   ✓ Version: {data.get('version')}")
+            print(f"   ✓ Features: {len(data.get('features', []))} features")
         
         print("\n✅ API tests passed!")
         
@@ -138,13 +178,13 @@ def test_api_optimization():
         print(f"\n❌ API test failed: {e}")
 
 
-def compare_with_original():
-    """Compare optimized vs original predictor."""
+def compare_with_original(optimized):
+    """Compare optimized vs original predictor (reusing the warmed optimized one)."""
     print("\n" + "=" * 60)
     print("Comparing Original vs Optimized")
     print("=" * 60)
     
-    test_image = "test_images/beach.jpg"
+    test_image = TEST_IMAGE
     
     if not os.path.exists(test_image):
         print("⚠ Test image not found, skipping comparison")
@@ -156,17 +196,17 @@ def compare_with_original():
         from inference.pretrained_predictor import PretrainedPredictor
         
         original = PretrainedPredictor()
+        original.predict(test_image, method="greedy", max_length=5)  # warm-up
         start = time.time()
         result1 = original.predict(test_image, method="beam_search", beam_width=5, max_length=50)
         original_time = time.time() - start
         print(f"   ✓ Time: {original_time*1000:.0f}ms")
         print(f"   ✓ Caption: {result1['caption']}")
         
-        # Test optimized
+        # Test optimized (same call as the earlier fast-mode test, so drop
+        # the cached result to time a real inference)
         print("\n2. Testing Optimized Predictor...")
-        from inference.optimized_predictor import get_optimized_predictor
-        
-        optimized = get_optimized_predictor()
+        optimized.clear_cache()
         start = time.time()
         result2 = optimized.predict(test_image, method="beam_search", beam_width=3, max_length=30)
         optimized_time = time.time() - start
@@ -190,14 +230,21 @@ def main():
     print("IMAGE CAPTIONING OPTIMIZATION TEST SUITE")
     print("=" * 60)
     
+    # Load the optimized predictor once; both tests below use it
+    print("\n" + "=" * 60)
+    print("Loading Optimized Predictor")
+    print("=" * 60)
+    ensure_test_image()
+    predictor, load_time = load_optimized_predictor()
+    
     # Test optimized predictor
-    test_optimized_predictor()
+    test_optimized_predictor(predictor, load_time)
     
     # Test API
     test_api_optimization()
     
     # Compare performance
-    compare_with_original()
+    compare_with_original(predictor)
     
     print("\n" + "=" * 60)
     print("ALL TESTS COMPLETED")
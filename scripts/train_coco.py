@@ -6,16 +6,206 @@ More flexible than shell script, works on Windows/Linux/Mac.
 import os
 import sys
 import json
+import asyncio
 import argparse
+import zipfile
 import subprocess
+import multiprocessing
+from collections import Counter
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+DOWNLOAD_CONNECTIONS = 8      # concurrent range requests per file
+DOWNLOAD_CHUNK = 1 << 20      # bytes per read / pwrite
+PROGRESS_EVERY = 64           # chunks between progress-file updates
+
+IMAGE_ARCHIVES = ['train2017.zip', 'val2017.zip']
+ANNOTATIONS_ARCHIVE = 'annotations_trainval2017.zip'
+
 # Add backend to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
 
 
-def download_coco_dataset(data_dir: Path):
-    """Download MS COCO dataset."""
+def _extract_members(zip_path: Path, names, dest: Path):
+    """Extract names from zip_path (each thread opens its own ZipFile; they aren't thread-safe)."""
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for name in names:
+            zip_ref.extract(name, dest)
+
+
+def _extract_zip(zip_path: Path, threads: int = 8):
+    """
+    Extract a zip next to itself, sharding members across threads.
+    
+    Runs in a worker process so the archives decompress on separate cores.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        names = zip_ref.namelist()
+    
+    # Create directories up front so threads don't race on makedirs
+    dest = zip_path.parent
+    for directory in {os.path.dirname(name) for name in names}:
+        (dest / directory).mkdir(parents=True, exist_ok=True)
+    
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(_extract_members, [zip_path] * threads,
+                      [names[i::threads] for i in range(threads)], [dest] * threads))
+    return zip_path.name
+
+
+async def _download_range(session, url: str, fd: int, span: list, save_progress,
+                          validator: str = None):
+    """
+    Fetch bytes span[0]..span[1] of url into fd; span[0] advances as data lands.
+    
+    With a validator (ETag or Last-Modified) the request carries If-Range, so
+    a file changed on the server comes back whole (200) instead of as a range
+    of the new version spliced onto the old bytes.
+    """
+    start, end = span
+    if start > end:
+        return
+    headers = {'Range': f'bytes={start}-{end}'}
+    if validator:
+        headers['If-Range'] = validator
+    async with session.get(url, headers=headers) as response:
+        # 200 (whole body) is only usable for a range starting at 0
+        if response.status != 206 and not (response.status == 200 and start == 0):
+            raise RuntimeError(f"range request returned HTTP {response.status}")
+        chunks = 0
+        async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK):
+            os.pwrite(fd, chunk, span[0])
+            span[0] += len(chunk)
+            chunks += 1
+            if chunks % PROGRESS_EVERY == 0:
+                save_progress()
+
+
+async def _download_file(session, url: str, filepath: Path, connections: int):
+    """
+    Download url to filepath over several concurrent range requests.
+    
+    Data goes to <file>.part; the not-yet-downloaded span of every range is
+    kept in <file>.part.json so an interrupted download resumes where each
+    connection stopped. The .part file is renamed once complete.
+    """
+    part = filepath.with_name(filepath.name + '.part')
+    progress_file = filepath.with_name(filepath.name + '.part.json')
+    
+    async with session.head(url, allow_redirects=True) as response:
+        response.raise_for_status()
+        size = int(response.headers['Content-Length'])
+        if response.headers.get('Accept-Ranges') != 'bytes':
+            connections = 1
+        # Weak ETags aren't allowed in If-Range
+        etag = response.headers.get('ETag')
+        validator = etag if etag and not etag.startswith('W/') else response.headers.get('Last-Modified')
+    
+    spans = None
+    if part.exists() and progress_file.exists():
+        progress = json.loads(progress_file.read_text())
+        # Only resume bytes of the same version of the file
+        if progress.get('size') == size and progress.get('validator') == validator:
+            spans = progress['spans']
+    if spans is None:
+        step = -(-size // connections)
+        spans = [[start, min(start + step, size) - 1] for start in range(0, size, step)]
+    
+    def save_progress():
+        tmp = progress_file.with_name(progress_file.name + '.tmp')
+        tmp.write_text(json.dumps({'size': size, 'validator': validator, 'spans': spans}))
+        os.replace(tmp, progress_file)
+    
+    fd = os.open(part, os.O_RDWR | os.O_CREAT)
+    try:
+        if os.fstat(fd).st_size != size:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+        save_progress()
+        tasks = [asyncio.ensure_future(_download_range(session, url, fd, span, save_progress, validator))
+                 for span in spans]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # gather doesn't stop the other ranges when one fails; they write
+            # through fd, so they must be finished before it is closed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+        save_progress()
+    
+    os.replace(part, filepath)
+    progress_file.unlink()
+
+
+async def _download_all(downloads, connections: int = DOWNLOAD_CONNECTIONS):
+    """Download all (url, filepath) pairs concurrently; returns {filename: error} for failures."""
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+    # Byte ranges must be raw bytes, so no transparent decompression
+    async with aiohttp.ClientSession(timeout=timeout, auto_decompress=False) as session:
+        results = await asyncio.gather(
+            *(_download_file(session, url, filepath, connections) for url, filepath in downloads),
+            return_exceptions=True
+        )
+    return {filepath.name: error for (_, filepath), error in zip(downloads, results)
+            if isinstance(error, BaseException)}
+
+
+def _download_with_cli(url: str, filepath: Path) -> bool:
+    """Download with wget, falling back to curl."""
+    try:
+        subprocess.run(['wget', '-c', url, '-O', str(filepath)], check=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        pass
+    try:
+        subprocess.run(['curl', '-C', '-', '-o', str(filepath), url], check=True)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def extract_archives(data_dir: Path, filenames):
+    """Extract the given archives in data_dir (all at once, one process each)."""
+    archives = [data_dir / filename for filename in filenames if (data_dir / filename).exists()]
+    
+    if archives:
+        print(f"Extracting {', '.join(path.name for path in archives)}...")
+        with ProcessPoolExecutor(max_workers=len(archives)) as pool:
+            for filename in pool.map(_extract_zip, archives):
+                print(f"✅ Extracted {filename}")
+
+
+def download_coco_dataset(data_dir: Path, images: bool = True):
+    """
+    Download MS COCO dataset.
+    
+    Only the annotations are extracted here, since building the vocabulary
+    needs nothing else; the image archives are extracted right before
+    training (see main).
+    
+    Args:
+        data_dir: Directory for the archives
+        images: Also download the train/val image archives
+    """
     print("\n" + "="*50)
     print("Downloading MS COCO 2017 Dataset")
     print("="*50)
@@ -27,7 +217,10 @@ def download_coco_dataset(data_dir: Path):
         'val_images': 'http://images.cocodataset.org/zips/val2017.zip',
         'annotations': 'http://images.cocodataset.org/annotations/annotations_trainval2017.zip'
     }
+    if not images:
+        del urls['train_images'], urls['val_images']
     
+    pending = []
     for name, url in urls.items():
         filename = url.split('/')[-1]
         filepath = data_dir / filename
@@ -38,36 +231,66 @@ def download_coco_dataset(data_dir: Path):
         
         print(f"\nDownloading {name} ({filename})...")
         print(f"URL: {url}")
-        
-        # Use wget or curl
-        try:
-            subprocess.run(['wget', '-c', url, '-O', str(filepath)], check=True)
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            try:
-                subprocess.run(['curl', '-C', '-', '-o', str(filepath), url], check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                print(f"❌ Failed to download {filename}")
+        pending.append((url, filepath))
+    
+    # With aiohttp: all files at once, several range requests each (needs
+    # os.pwrite, i.e. not Windows); otherwise wget/curl one file at a time
+    if pending and AIOHTTP_AVAILABLE and hasattr(os, 'pwrite'):
+        failed = asyncio.run(_download_all(pending))
+        for filename, error in failed.items():
+            print(f"❌ Failed to download {filename}: {error}")
+        if failed:
+            print("Run again to resume, or download manually from:")
+            for url, filepath in pending:
+                if filepath.name in failed:
+                    print(f"  {url}")
+            return False
+    else:
+        for url, filepath in pending:
+            if not _download_with_cli(url, filepath):
+                print(f"❌ Failed to download {filepath.name}")
                 print("Please install wget or curl, or download manually from:")
                 print(f"  {url}")
                 return False
     
-    # Extract files
-    print("\nExtracting files...")
-    import zipfile
+    # Extract annotations only; images wait until training needs them
+    if not (data_dir / 'annotations').exists():
+        print("\nExtracting files...")
+        extract_archives(data_dir, [ANNOTATIONS_ARCHIVE])
     
-    for filename in ['train2017.zip', 'val2017.zip', 'annotations_trainval2017.zip']:
-        filepath = data_dir / filename
-        if filepath.exists():
-            print(f"Extracting {filename}...")
-            with zipfile.ZipFile(filepath, 'r') as zip_ref:
-                zip_ref.extractall(data_dir)
-            print(f"✅ Extracted {filename}")
-    
-    print("\n✅ Dataset ready!")
+    print("\n✅ Dataset downloaded!")
     return True
 
 
-def build_vocabulary(captions_file: Path, vocab_file: Path, freq_threshold: int = 5):
+def iter_captions(captions_file: Path):
+    """
+    Yield the caption strings of a COCO annotations file.
+    
+    With ijson the file is parsed as a stream, so neither the parsed JSON
+    nor a caption list is held in memory; otherwise falls back to json.load.
+    """
+    with open(captions_file, 'rb') as f:
+        if IJSON_AVAILABLE:
+            yield from ijson.items(f, 'annotations.item.caption')
+        else:
+            yield from (ann['caption'] for ann in json.load(f)['annotations'])
+
+
+def _count_shard(captions):
+    """Word counts for one shard of captions (runs in a worker process)."""
+    from training.vocabulary import Vocabulary
+    return Vocabulary.count_words(captions)
+
+
+def _shards(iterable, size: int):
+    """Split an iterable into lists of up to size items."""
+    iterator = iter(iterable)
+    while shard := list(islice(iterator, size)):
+        yield shard
+
+
+def build_vocabulary(captions_file: Path, vocab_file: Path, freq_threshold: int = 5,
+                     shard_size: int = 10_000):
     """Build vocabulary from captions."""
     print("\n" + "="*50)
     print("Building Vocabulary")
@@ -75,16 +298,25 @@ def build_vocabulary(captions_file: Path, vocab_file: Path, freq_threshold: int
     
     from training.vocabulary import Vocabulary
     
-    # Load captions
-    with open(captions_file, 'r') as f:
-        data = json.load(f)
+    # Stream captions straight into the word count
+    num_captions = 0
     
-    captions = [ann['caption'] for ann in data['annotations']]
-    print(f"Total captions: {len(captions):,}")
+    def captions():
+        nonlocal num_captions
+        for num_captions, caption in enumerate(iter_captions(captions_file), 1):
+            yield caption
+    
+    # Tokenize and count shards on all cores; merging is O(vocabulary size).
+    # imap keeps shard order, so ties rank exactly as in a serial count
+    word_counts = Counter()
+    with multiprocessing.Pool() as pool:
+        for shard_counts in pool.imap(_count_shard, _shards(captions(), shard_size)):
+            word_counts.update(shard_counts)
+    print(f"Total captions: {num_captions:,}")
     
     # Build vocabulary
     vocab = Vocabulary(freq_threshold=freq_threshold)
-    vocab.build_vocabulary(captions)
+    vocab.build_from_counts(word_counts)
     
     # Save
     vocab.save(str(vocab_file))
@@ -100,39 +332,37 @@ def train_model(args):
     print("Training Image Captioning Model")
     print("="*50)
     
-    from training.train import main as train_main
-    
-    # Override sys.argv for argparse
-    sys.argv = [
-        'train.py',
-        '--train_image_dir', str(args.data_dir / 'train2017'),
-        '--train_captions', str(args.data_dir / 'annotations' / 'captions_train2017.json'),
-        '--val_image_dir', str(args.data_dir / 'val2017'),
-        '--val_captions', str(args.data_dir / 'annotations' / 'captions_val2017.json'),
-        '--dataset_type', 'coco',
-        '--vocab_path', str(args.checkpoint_dir / 'vocab.json'),
-        '--checkpoint_dir', str(args.checkpoint_dir),
-        '--batch_size', str(args.batch_size),
-        '--num_epochs', str(args.num_epochs),
-        '--learning_rate', str(args.learning_rate),
-        '--encoder_lr', str(args.encoder_lr),
-        '--device', args.device,
-        '--num_workers', str(args.num_workers),
-        '--seed', str(args.seed),
-        '--gradient_clip', '5.0',
-        '--scheduler', 'plateau',
-        '--early_stopping', '5',
-        '--log_interval', '100'
-    ]
-    
-    if args.fine_tune_encoder:
-        sys.argv.extend(['--fine_tune_encoder', '--fine_tune_layers', '2'])
-    
-    if args.use_amp:
-        sys.argv.append('--use_amp')
+    from training.train import TrainConfig, run
+    
+    data_dir = args.data_dir
+    annotations_dir = data_dir / 'annotations'
+    
+    config = TrainConfig(
+        train_image_dir=data_dir / 'train2017',
+        train_captions=annotations_dir / 'captions_train2017.json',
+        val_image_dir=data_dir / 'val2017',
+        val_captions=annotations_dir / 'captions_val2017.json',
+        dataset_type='coco',
+        vocab_path=args.checkpoint_dir / 'vocab.json',
+        checkpoint_dir=args.checkpoint_dir,
+        batch_size=args.batch_size,
+        num_epochs=args.num_epochs,
+        learning_rate=args.learning_rate,
+        encoder_lr=args.encoder_lr,
+        device=args.device,
+        num_workers=args.num_workers,
+        seed=args.seed,
+        gradient_clip=5.0,
+        scheduler='plateau',
+        early_stopping=5,
+        log_interval=100,
+        fine_tune_encoder=args.fine_tune_encoder,
+        fine_tune_layers=2,
+        use_amp=args.use_amp
+    )
     
     # Run training
-    train_main()
+    run(config)
 
 
 def main():
@@ -163,6 +393,8 @@ def main():
                        help='Download dataset if not present')
     parser.add_argument('--vocab_threshold', type=int, default=5,
                        help='Minimum word frequency for vocabulary')
+    parser.add_argument('--vocab_only', action='store_true',
+                       help='Only build the vocabulary (skips downloading/extracting images)')
     
     args = parser.parse_args()
     
@@ -186,9 +418,12 @@ def main():
     val_dir = args.data_dir / 'val2017'
     annotations_dir = args.data_dir / 'annotations'
     
-    if not (train_dir.exists() and val_dir.exists() and annotations_dir.exists()):
+    images_ready = train_dir.exists() and val_dir.exists()
+    images_archived = all((args.data_dir / filename).exists() for filename in IMAGE_ARCHIVES)
+    
+    if not annotations_dir.exists() or not (args.vocab_only or images_ready or images_archived):
         if args.download:
-            if not download_coco_dataset(args.data_dir):
+            if not download_coco_dataset(args.data_dir, images=not args.vocab_only):
                 print("\n❌ Failed to download dataset")
                 return
         else:
@@ -210,6 +445,14 @@ def main():
     else:
         print(f"\n✅ Vocabulary already exists: {vocab_file}")
     
+    if args.vocab_only:
+        return
+    
+    # Extract images only now that training is about to start
+    if not images_ready:
+        print("\nExtracting images...")
+        extract_archives(args.data_dir, IMAGE_ARCHIVES)
+    
     # Step 3: Train model
     train_model(args)
     
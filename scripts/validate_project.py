@@ -5,11 +5,66 @@ Checks all files, dependencies, and configurations.
 """
 
 import os
+import re
 import sys
 import json
 from pathlib import Path
 from typing import List, Tuple
 
+# Static manifest, built once at import
+REQUIRED_DIRS = frozenset({
+    "backend",
+    "backend/models",
+    "backend/training",
+    "backend/inference",
+    "backend/api",
+    "backend/database",
+    "frontend",
+    "frontend/app",
+    "frontend/components",
+    "scripts",
+})
+
+REQUIRED_FILES = frozenset({
+    "backend/requirements.txt",
+    "backend/.env.example",
+    "backend/api/main.py",
+    "backend/models/encoder.py",
+    "backend/models/decoder.py",
+    "frontend/package.json",
+    "frontend/app/page.tsx",
+    "docker-compose.yml",
+    "README.md",
+})
+
+REQUIRED_ENV_VARS = frozenset({
+    'DATABASE_URL',
+    'SECRET_KEY',
+    'MODEL_CHECKPOINT_PATH',
+    'VOCAB_PATH',
+})
+
+CRITICAL_PKGS = frozenset({'torch', 'fastapi', 'sqlalchemy', 'pydantic'})
+
+REQUIRED_SCRIPTS = frozenset({
+    "train_coco.sh",
+    "train_flickr8k.sh",
+    "train_coco.py",
+    "compare_models.py",
+    "benchmark.py",
+    "deploy_render.sh",
+    "deploy_vercel.sh",
+    "setup_free_tier.py",
+})
+
+# Critical package patterns, longest first (see validate_dependencies)
+CRITICAL_PATTERN = re.compile(
+    '(?=(' + '|'.join(sorted(map(re.escape, CRITICAL_PKGS), key=len, reverse=True)) + '))'
+)
+
+# NAME= assignments in a .env file, one per line
+ENV_ASSIGNMENT = re.compile(r'^\s*(?:export\s+)?(\w+)\s*=', re.M)
+
 class ProjectValidator:
     """Validate project structure and dependencies."""
     
@@ -17,6 +72,21 @@ class ProjectValidator:
         self.project_root = Path(__file__).parent.parent
         self.errors = []
         self.warnings = []
+        # Directory listings (relative parent -> entry names), read once each
+        self._dir_cache = {}
+    
+    def _exists(self, rel_path: str) -> bool:
+        """Check rel_path against one os.scandir listing of its parent instead of a stat per path."""
+        parent, _, name = rel_path.replace('\\', '/').rpartition('/')
+        entries = self._dir_cache.get(parent)
+        if entries is None:
+            try:
+                with os.scandir(self.project_root / parent) as it:
+                    entries = frozenset(entry.name for entry in it)
+            except OSError:
+                entries = frozenset()
+            self._dir_cache[parent] = entries
+        return name in entries
     
     def validate_structure(self) -> bool:
         """Validate project directory structure."""
@@ -24,22 +94,9 @@ class ProjectValidator:
         print("VALIDATING PROJECT STRUCTURE")
         print("="*60)
         
-        required_dirs = [
-            "backend",
-            "backend/models",
-            "backend/training",
-            "backend/inference",
-            "backend/api",
-            "backend/database",
-            "frontend",
-            "frontend/app",
-            "frontend/components",
-            "scripts",
-        ]
-        
-        for dir_path in required_dirs:
-            full_path = self.project_root / dir_path
-            if full_path.exists():
+        missing = {path for path in REQUIRED_DIRS if not self._exists(path)}
+        for dir_path in sorted(REQUIRED_DIRS):
+            if dir_path not in missing:
                 print(f"✅ {dir_path}")
             else:
                 print(f"❌ {dir_path} - MISSING")
@@ -53,21 +110,9 @@ class ProjectValidator:
         print("VALIDATING CRITICAL FILES")
         print("="*60)
         
-        required_files = [
-            "backend/requirements.txt",
-            "backend/.env.example",
-            "backend/api/main.py",
-            "backend/models/encoder.py",
-            "backend/models/decoder.py",
-            "frontend/package.json",
-            "frontend/app/page.tsx",
-            "docker-compose.yml",
-            "README.md",
-        ]
-        
-        for file_path in required_files:
-            full_path = self.project_root / file_path
-            if full_path.exists():
+        missing = {path for path in REQUIRED_FILES if not self._exists(path)}
+        for file_path in sorted(REQUIRED_FILES):
+            if file_path not in missing:
                 print(f"✅ {file_path}")
             else:
                 print(f"❌ {file_path} - MISSING")
@@ -83,20 +128,24 @@ class ProjectValidator:
         
         req_file = self.project_root / "backend" / "requirements.txt"
         
-        if not req_file.exists():
+        if not self._exists("backend/requirements.txt"):
             print("❌ requirements.txt not found")
             return False
         
         try:
-            with open(req_file) as f:
-                lines = [l.strip() for l in f if l.strip() and not l.startswith('#')]
+            lines = [l.strip() for l in req_file.read_text(encoding='utf-8').splitlines()
+                     if l.strip() and not l.startswith('#')]
             
             print(f"✅ Found {len(lines)} dependencies")
             
-            # Check for critical packages
-            critical = ['torch', 'fastapi', 'sqlalchemy', 'pydantic']
-            for pkg in critical:
-                if any(pkg in line.lower() for line in lines):
+            # Check for critical packages: one scan of the lowercased text finds
+            # every pattern. The lookahead catches overlapping matches; longest
+            # alternatives go first and a match also counts for its prefixes
+            matches = set(CRITICAL_PATTERN.findall('\n'.join(lines).lower()))
+            found = {pkg for match in matches for pkg in CRITICAL_PKGS if match.startswith(pkg)}
+            missing = CRITICAL_PKGS - found
+            for pkg in sorted(CRITICAL_PKGS):
+                if pkg not in missing:
                     print(f"✅ {pkg}")
                 else:
                     print(f"⚠️  {pkg} not found")
@@ -116,24 +165,18 @@ class ProjectValidator:
         
         env_file = self.project_root / "backend" / ".env.example"
         
-        if not env_file.exists():
+        if not self._exists("backend/.env.example"):
             print("❌ .env.example not found")
             self.errors.append("Missing .env.example")
             return False
         
         try:
-            with open(env_file) as f:
-                content = f.read()
-            
-            required_vars = [
-                'DATABASE_URL',
-                'SECRET_KEY',
-                'MODEL_CHECKPOINT_PATH',
-                'VOCAB_PATH',
-            ]
+            content = env_file.read_text(encoding='utf-8')
             
-            for var in required_vars:
-                if var in content:
+            # Collect every defined variable in one pass, then diff
+            missing = REQUIRED_ENV_VARS - set(ENV_ASSIGNMENT.findall(content))
+            for var in sorted(REQUIRED_ENV_VARS):
+                if var not in missing:
                     print(f"✅ {var}")
                 else:
                     print(f"❌ {var} - MISSING")
@@ -151,19 +194,15 @@ class ProjectValidator:
         print("VALIDATING DOCKER CONFIGURATION")
         print("="*60)
         
-        docker_compose = self.project_root / "docker-compose.yml"
-        dockerfile_backend = self.project_root / "Dockerfile"
-        dockerfile_frontend = self.project_root / "frontend" / "Dockerfile"
-        
         files = [
-            (docker_compose, "docker-compose.yml"),
-            (dockerfile_backend, "Dockerfile (backend)"),
-            (dockerfile_frontend, "frontend/Dockerfile"),
+            ("docker-compose.yml", "docker-compose.yml"),
+            ("Dockerfile", "Dockerfile (backend)"),
+            ("frontend/Dockerfile", "frontend/Dockerfile"),
         ]
         
         all_exist = True
         for file_path, name in files:
-            if file_path.exists():
+            if self._exists(file_path):
                 print(f"✅ {name}")
             else:
                 print(f"❌ {name} - MISSING")
@@ -178,26 +217,13 @@ class ProjectValidator:
         print("VALIDATING AUTOMATION SCRIPTS")
         print("="*60)
         
-        scripts = [
-            "train_coco.sh",
-            "train_flickr8k.sh",
-            "train_coco.py",
-            "compare_models.py",
-            "benchmark.py",
-            "deploy_render.sh",
-            "deploy_vercel.sh",
-            "setup_free_tier.py",
-        ]
-        
-        scripts_dir = self.project_root / "scripts"
-        
-        if not scripts_dir.exists():
+        if not self._exists("scripts"):
             print("❌ scripts directory not found")
             return False
         
-        for script in scripts:
-            script_path = scripts_dir / script
-            if script_path.exists():
+        missing = {script for script in REQUIRED_SCRIPTS if not self._exists(f"scripts/{script}")}
+        for script in sorted(REQUIRED_SCRIPTS):
+            if script not in missing:
                 print(f"✅ {script}")
             else:
                 print(f"⚠️  {script} - MISSING")
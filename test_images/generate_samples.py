@@ -3,64 +3,114 @@ Generate sample test images for image captioning demo.
 Creates simple synthetic images for testing without requiring real datasets.
 """
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
+import numpy as np
 import os
 
+WIDTH, HEIGHT = 640, 480
+
+# Pixel coordinate grids, shared by every shape mask (broadcast to HxW)
+YY, XX = np.ogrid[0:HEIGHT, 0:WIDTH]
+
+def _rgb(hex_color):
+    """'#RRGGBB' -> uint8 RGB triple"""
+    return np.frombuffer(bytes.fromhex(hex_color[1:]), dtype=np.uint8)
+
+# Colors, parsed once
+SKY = _rgb('#87CEEB')
+SAND = _rgb('#F4A460')
+SUN = _rgb('#FFD700')
+DIM_GRAY = _rgb('#696969')
+FOREST_GREEN = _rgb('#228B22')
+DARK_GRAY = _rgb('#A9A9A9')
+GRAY = _rgb('#808080')
+SLATE_GRAY = _rgb('#708090')
+TRUNK_BROWN = _rgb('#8B4513')
+LIGHT_GREEN = _rgb('#90EE90')
+
+def _canvas(color):
+    """New HxWx3 image filled with color"""
+    arr = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    arr[:] = color
+    return arr
+
+def _rectangle(arr, box, color):
+    """Fill box = [x1, y1, x2, y2] (inclusive, like ImageDraw.rectangle)"""
+    x1, y1, x2, y2 = box
+    arr[y1:y2 + 1, x1:x2 + 1] = color
+
+def _ellipse(arr, box, color):
+    """Fill the ellipse inscribed in box = [x1, y1, x2, y2]"""
+    x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    rx, ry = (x2 - x1) / 2, (y2 - y1) / 2
+    arr[((XX - cx) / rx) ** 2 + ((YY - cy) / ry) ** 2 <= 1] = color
+
+def _polygon(arr, points, color):
+    """Fill a convex polygon: the intersection of one half-plane per edge"""
+    mask = np.ones((HEIGHT, WIDTH), dtype=bool)
+    # Orientation of the vertex order decides which side is inside
+    (ax, ay), (bx, by), (cx, cy) = points[:3]
+    sign = 1 if (bx - ax) * (cy - ay) - (by - ay) * (cx - ax) >= 0 else -1
+    for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+        mask &= sign * ((x1 - x0) * (YY - y0) - (y1 - y0) * (XX - x0)) >= 0
+    arr[mask] = color
+
+def _save(arr, filename):
+    """Encode as JPEG (no optimize pass; 4:2:0 chroma subsampling)"""
+    Image.fromarray(arr).save(filename, 'JPEG', quality=85, optimize=False, subsampling=2)
+
 def generate_sample_images():
     """Generate sample test images"""
     
     os.makedirs('.', exist_ok=True)
     
     # Sample 1: Beach scene
-    img1 = Image.new('RGB', (640, 480), color='#87CEEB')
-    draw1 = ImageDraw.Draw(img1)
+    img1 = _canvas(SKY)
     # Sky
-    draw1.rectangle([0, 0, 640, 300], fill='#87CEEB')
+    _rectangle(img1, [0, 0, 640, 300], SKY)
     # Sand
-    draw1.rectangle([0, 300, 640, 480], fill='#F4A460')
+    _rectangle(img1, [0, 300, 640, 480], SAND)
     # Sun
-    draw1.ellipse([500, 50, 600, 150], fill='#FFD700')
-    img1.save('beach.jpg', 'JPEG')
+    _ellipse(img1, [500, 50, 600, 150], SUN)
+    _save(img1, 'beach.jpg')
     print("✓ Created beach.jpg")
     
     # Sample 2: Mountain scene
-    img2 = Image.new('RGB', (640, 480), color='#87CEEB')
-    draw2 = ImageDraw.Draw(img2)
+    img2 = _canvas(SKY)
     # Sky
-    draw2.rectangle([0, 0, 640, 300], fill='#87CEEB')
+    _rectangle(img2, [0, 0, 640, 300], SKY)
     # Mountain
-    draw2.polygon([(100, 300), (320, 100), (540, 300)], fill='#696969')
+    _polygon(img2, [(100, 300), (320, 100), (540, 300)], DIM_GRAY)
     # Ground
-    draw2.rectangle([0, 300, 640, 480], fill='#228B22')
-    img2.save('mountain.jpg', 'JPEG')
+    _rectangle(img2, [0, 300, 640, 480], FOREST_GREEN)
+    _save(img2, 'mountain.jpg')
     print("✓ Created mountain.jpg")
     
     # Sample 3: City scene
-    img3 = Image.new('RGB', (640, 480), color='#87CEEB')
-    draw3 = ImageDraw.Draw(img3)
+    img3 = _canvas(SKY)
     # Sky
-    draw3.rectangle([0, 0, 640, 240], fill='#87CEEB')
+    _rectangle(img3, [0, 0, 640, 240], SKY)
     # Buildings
-    draw3.rectangle([100, 150, 200, 400], fill='#A9A9A9')
-    draw3.rectangle([250, 100, 350, 400], fill='#808080')
-    draw3.rectangle([400, 180, 500, 400], fill='#696969')
+    _rectangle(img3, [100, 150, 200, 400], DARK_GRAY)
+    _rectangle(img3, [250, 100, 350, 400], GRAY)
+    _rectangle(img3, [400, 180, 500, 400], DIM_GRAY)
     # Ground
-    draw3.rectangle([0, 400, 640, 480], fill='#708090')
-    img3.save('city.jpg', 'JPEG')
+    _rectangle(img3, [0, 400, 640, 480], SLATE_GRAY)
+    _save(img3, 'city.jpg')
     print("✓ Created city.jpg")
     
     # Sample 4: Nature scene
-    img4 = Image.new('RGB', (640, 480), color='#87CEEB')
-    draw4 = ImageDraw.Draw(img4)
+    img4 = _canvas(SKY)
     # Sky
-    draw4.rectangle([0, 0, 640, 200], fill='#87CEEB')
+    _rectangle(img4, [0, 0, 640, 200], SKY)
     # Tree trunk
-    draw4.rectangle([280, 200, 360, 400], fill='#8B4513')
+    _rectangle(img4, [280, 200, 360, 400], TRUNK_BROWN)
     # Tree foliage
-    draw4.ellipse([200, 100, 440, 300], fill='#228B22')
+    _ellipse(img4, [200, 100, 440, 300], FOREST_GREEN)
     # Ground
-    draw4.rectangle([0, 400, 640, 480], fill='#90EE90')
-    img4.save('tree.jpg', 'JPEG')
+    _rectangle(img4, [0, 400, 640, 480], LIGHT_GREEN)
+    _save(img4, 'tree.jpg')
     print("✓ Created tree.jpg")
     
     print("\n✅ All sample images created successfully!")